@@ -1,7 +1,7 @@
 """MCP Server implementation with tool registration."""
 
 import json
-from typing import Any, Sequence
+from typing import Any, Callable, Sequence
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -14,10 +14,23 @@ from tools.summary import summarize_transcode_comparison
 from utils.ffmpeg import FFmpegError
 
 
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+
 # Create MCP server instance
 app = Server("video-quality-mcp")
 
 
+def _dumps(obj: Any) -> str:
+    """Serialize a tool response to indented JSON text."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
 def create_error_response(error_message: str) -> dict:
     """Create standardized error response."""
     return {
@@ -26,201 +39,203 @@ def create_error_response(error_message: str) -> dict:
     }
 
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List all available tools."""
-    return [
-        Tool(
-            name="analyze_video_metadata",
-            description="分析视频文件的元信息和编码参数，包括容器格式、编码器、分辨率、帧率等",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "path": {
-                        "type": "string",
-                        "description": "视频文件路径"
-                    }
+# Tool definitions are static, so build them once at import time
+_TOOLS = [
+    Tool(
+        name="analyze_video_metadata",
+        description="分析视频文件的元信息和编码参数，包括容器格式、编码器、分辨率、帧率等",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "视频文件路径"
+                }
+            },
+            "required": ["path"]
+        }
+    ),
+    Tool(
+        name="analyze_gop_structure",
+        description="分析视频的 GOP 结构和帧类型分布，包括 I/P/B 帧统计和关键帧时间戳",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "视频文件路径"
                 },
-                "required": ["path"]
-            }
-        ),
-        Tool(
-            name="analyze_gop_structure",
-            description="分析视频的 GOP 结构和帧类型分布，包括 I/P/B 帧统计和关键帧时间戳",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "path": {
-                        "type": "string",
-                        "description": "视频文件路径"
-                    }
+                "packets_only": {
+                    "type": "boolean",
+                    "description": "仅读取封装层数据包（不解码），速度更快，但不统计 I/P/B 帧分布",
+                    "default": False
+                }
+            },
+            "required": ["path"]
+        }
+    ),
+    Tool(
+        name="compare_quality_metrics",
+        description="对比两个视频文件的画质指标，包括 PSNR、SSIM 和 VMAF",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "reference": {
+                    "type": "string",
+                    "description": "参考视频路径"
                 },
-                "required": ["path"]
-            }
-        ),
-        Tool(
-            name="compare_quality_metrics",
-            description="对比两个视频文件的画质指标，包括 PSNR、SSIM 和 VMAF",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "reference": {
-                        "type": "string",
-                        "description": "参考视频路径"
-                    },
-                    "distorted": {
-                        "type": "string",
-                        "description": "待评估视频路径"
-                    }
+                "distorted": {
+                    "type": "string",
+                    "description": "待评估视频路径"
                 },
-                "required": ["reference", "distorted"]
-            }
-        ),
-        Tool(
-            name="analyze_artifacts",
-            description="分析视频伪影和主观质量代理指标。可进行单流分析或转码前后对比分析",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "target": {
-                        "type": "string",
-                        "description": "目标视频路径"
-                    },
-                    "reference": {
-                        "type": "string",
-                        "description": "参考视频路径（可选，提供时进行对比分析）"
-                    }
+                "vmaf_subsample": {
+                    "type": "integer",
+                    "description": "VMAF 抽样间隔，每 N 帧计算一帧（默认 1，即逐帧计算）",
+                    "default": 1,
+                    "minimum": 1
                 },
-                "required": ["target"]
-            }
-        ),
-        Tool(
-            name="summarize_transcode_comparison",
-            description="生成转码效果的综合评估报告，包括质量变化、关键问题和优化建议",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "source": {
-                        "type": "string",
-                        "description": "源视频路径"
-                    },
-                    "transcoded": {
-                        "type": "string",
-                        "description": "转码后视频路径"
-                    }
+                "quality_preset": {
+                    "type": "string",
+                    "description": "质量评估预设：fast 抽样计算 VMAF 用于快速预览，full 逐帧计算用于最终报告",
+                    "enum": ["fast", "full"],
+                    "default": "full"
+                }
+            },
+            "required": ["reference", "distorted"]
+        }
+    ),
+    Tool(
+        name="analyze_artifacts",
+        description="分析视频伪影和主观质量代理指标。可进行单流分析或转码前后对比分析",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "target": {
+                    "type": "string",
+                    "description": "目标视频路径"
                 },
-                "required": ["source", "transcoded"]
-            }
-        )
-    ]
+                "reference": {
+                    "type": "string",
+                    "description": "参考视频路径（可选，提供时进行对比分析）"
+                }
+            },
+            "required": ["target"]
+        }
+    ),
+    Tool(
+        name="summarize_transcode_comparison",
+        description="生成转码效果的综合评估报告，包括质量变化、关键问题和优化建议",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "source": {
+                    "type": "string",
+                    "description": "源视频路径"
+                },
+                "transcoded": {
+                    "type": "string",
+                    "description": "转码后视频路径"
+                },
+                "vmaf_subsample": {
+                    "type": "integer",
+                    "description": "VMAF 抽样间隔，每 N 帧计算一帧（默认 1，即逐帧计算）",
+                    "default": 1,
+                    "minimum": 1
+                },
+                "quality_preset": {
+                    "type": "string",
+                    "description": "质量评估预设：fast 抽样计算 VMAF 用于快速预览，full 逐帧计算用于最终报告",
+                    "enum": ["fast", "full"],
+                    "default": "full"
+                }
+            },
+            "required": ["source", "transcoded"]
+        }
+    )
+]
+
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """List all available tools."""
+    return _TOOLS
+
+
+def _positive_int(value: Any) -> int:
+    """Coerce an optional integer argument, clamping it to at least 1."""
+    return max(int(value), 1)
+
+
+def _bool_arg(value: Any) -> bool:
+    """Coerce an optional boolean argument, rejecting ambiguous values."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        if normalized in ("true", "1"):
+            return True
+        if normalized in ("false", "0"):
+            return False
+    raise ValueError(f"Expected a boolean (true/false), got: {value!r}")
+
+
+# Tool name -> (handler, required arguments, optional argument converters).
+# Required arguments are passed positionally, optional ones as keywords.
+_HANDLERS: dict[str, tuple[Callable[..., dict], list[str], dict[str, Callable[[Any], Any]]]] = {
+    "analyze_video_metadata": (analyze_video_metadata, ["path"], {}),
+    "analyze_gop_structure": (analyze_gop_structure, ["path"], {"packets_only": _bool_arg}),
+    "compare_quality_metrics": (
+        compare_quality_metrics,
+        ["reference", "distorted"],
+        {"vmaf_subsample": _positive_int, "quality_preset": str}
+    ),
+    "analyze_artifacts": (analyze_artifacts, ["target"], {"reference": str}),
+    "summarize_transcode_comparison": (
+        summarize_transcode_comparison,
+        ["source", "transcoded"],
+        {"vmaf_subsample": _positive_int, "quality_preset": str}
+    )
+}
+
+
+def _text_response(payload: dict) -> list[TextContent]:
+    """Wrap a JSON-serializable payload as a tool response."""
+    return [TextContent(type="text", text=_dumps(payload))]
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> Sequence[TextContent]:
     """Handle tool calls."""
+    entry = _HANDLERS.get(name)
+    if entry is None:
+        return _text_response(create_error_response(f"Unknown tool: {name}"))
+    
+    handler, required, optional = entry
+    arguments = arguments or {}
+    
+    for key in required:
+        if not arguments.get(key):
+            return _text_response(create_error_response(f"Missing required parameter: {key}"))
+    
+    kwargs = {}
+    for key, convert in optional.items():
+        if arguments.get(key) is None:
+            continue
+        try:
+            kwargs[key] = convert(arguments[key])
+        except (TypeError, ValueError) as e:
+            return _text_response(create_error_response(f"Invalid parameter {key}: {str(e)}"))
+    
     try:
-        if name == "analyze_video_metadata":
-            path = arguments.get("path")
-            if not path:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: path"), ensure_ascii=False)
-                )]
-            
-            result = analyze_video_metadata(path)
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2)
-            )]
-        
-        elif name == "analyze_gop_structure":
-            path = arguments.get("path")
-            if not path:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: path"), ensure_ascii=False)
-                )]
-            
-            result = analyze_gop_structure(path)
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2)
-            )]
-        
-        elif name == "compare_quality_metrics":
-            reference = arguments.get("reference")
-            distorted = arguments.get("distorted")
-            
-            if not reference:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: reference"), ensure_ascii=False)
-                )]
-            if not distorted:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: distorted"), ensure_ascii=False)
-                )]
-            
-            result = compare_quality_metrics(reference, distorted)
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2)
-            )]
-        
-        elif name == "analyze_artifacts":
-            target = arguments.get("target")
-            reference = arguments.get("reference")
-            
-            if not target:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: target"), ensure_ascii=False)
-                )]
-            
-            result = analyze_artifacts(target, reference)
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2)
-            )]
-        
-        elif name == "summarize_transcode_comparison":
-            source = arguments.get("source")
-            transcoded = arguments.get("transcoded")
-            
-            if not source:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: source"), ensure_ascii=False)
-                )]
-            if not transcoded:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(create_error_response("Missing required parameter: transcoded"), ensure_ascii=False)
-                )]
-            
-            result = summarize_transcode_comparison(source, transcoded)
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2)
-            )]
-        
-        else:
-            return [TextContent(
-                type="text",
-                text=json.dumps(create_error_response(f"Unknown tool: {name}"), ensure_ascii=False)
-            )]
+        result = handler(*[arguments[key] for key in required], **kwargs)
+        return _text_response(result)
     
     except FFmpegError as e:
-        return [TextContent(
-            type="text",
-            text=json.dumps(create_error_response(str(e)), ensure_ascii=False)
-        )]
+        return _text_response(create_error_response(str(e)))
     except Exception as e:
-        return [TextContent(
-            type="text",
-            text=json.dumps(create_error_response(f"Unexpected error: {str(e)}"), ensure_ascii=False)
-        )]
+        return _text_response(create_error_response(f"Unexpected error: {str(e)}"))
 
 
 async def run_server():
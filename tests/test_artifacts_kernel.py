@@ -0,0 +1,89 @@
+"""Tests for the fused Numba artifact kernel."""
+
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("scipy")
+pytest.importorskip("numba")
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
+
+def _synthetic_frame():
+    """BGR frame with a gradient, mild noise and a raised block.
+    
+    The size is not a multiple of 8 so partial blocks and borders are
+    exercised, and no score saturates at 0 or 1.
+    """
+    import cv2
+    import numpy as np
+    
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:90, 0:124]
+    gray = np.clip(x * 1.2 + y * 0.9 + 20 + rng.normal(0, 2, x.shape), 0, 255).astype(np.uint8)
+    gray[30:60, 40:80] += 25
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def test_kernel_matches_opencv_detectors(monkeypatch):
+    """The fused kernel must give the same scores as the OpenCV detectors."""
+    from tools import artifacts
+    
+    assert artifacts.HAS_NUMBA
+    frame = _synthetic_frame()
+    
+    kernel_scores = artifacts._analyze_frame(frame)
+    monkeypatch.setattr(artifacts, "HAS_NUMBA", False)
+    reference_scores = artifacts._analyze_frame(frame)
+    
+    assert kernel_scores.keys() == reference_scores.keys()
+    for key, expected in reference_scores.items():
+        assert 0.0 < expected < 1.0 or key == "banding"
+        assert kernel_scores[key] == pytest.approx(expected, abs=1e-5), key
+
+
+@pytest.mark.skipif(FFMPEG is None or FFPROBE is None, reason="ffmpeg/ffprobe is not installed")
+def test_analyze_artifacts_from_worker_thread_exits(tmp_path):
+    """The interpreter must exit cleanly after analysis ran in a pool thread."""
+    video = tmp_path / "clip.mp4"
+    subprocess.run(
+        [
+            FFMPEG, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "testsrc=duration=2:size=320x240:rate=25",
+            "-pix_fmt", "yuv420p",
+            str(video)
+        ],
+        check=True
+    )
+    
+    script = textwrap.dedent("""
+        import sys
+        from concurrent.futures import ThreadPoolExecutor
+        from tools.artifacts import analyze_artifacts
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(analyze_artifacts, sys.argv[1]).result()
+        assert result["mode"] == "single"
+    """)
+    
+    env = dict(os.environ, VQ_MCP_NO_CACHE="1")
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(video)],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        timeout=300
+    )
+    
+    assert result.returncode == 0, result.stderr.decode("utf-8", errors="replace")
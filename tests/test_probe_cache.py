@@ -0,0 +1,22 @@
+"""Tests for the on-disk ffprobe cache."""
+
+from utils import probe_cache
+
+
+def test_unwritable_cache_path_falls_through_to_compute(tmp_path, monkeypatch):
+    """A cache directory that cannot be created must not break probing."""
+    blocker = tmp_path / "afile"
+    blocker.write_text("")
+    monkeypatch.setenv(probe_cache.CACHE_PATH_ENV, str(blocker / "sub" / "probe.sqlite3"))
+    monkeypatch.delenv(probe_cache.NO_CACHE_ENV, raising=False)
+    
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        return {"streams": []}
+    
+    value = probe_cache.cached_probe(str(tmp_path / "clip.mp4"), 1, 2, "video_info:test", compute)
+    
+    assert value == {"streams": []}
+    assert calls == [1]
@@ -0,0 +1,172 @@
+"""Fused Numba kernel for grayscale artifact statistics.
+
+The blur, blocking, ringing and dark-detail detectors in tools.artifacts each
+stream the full frame through memory several times (Laplacian, Sobel x2,
+high-pass, two box filters, per-block DCT). This module computes all of their
+stencils in one JIT-compiled pass over the image. Numba is optional; when it
+is not installed HAS_NUMBA is False and callers use the OpenCV detectors.
+"""
+
+import math
+from typing import NamedTuple, Optional
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+class GrayArtifactStats(NamedTuple):
+    """Raw per-frame statistics behind the grayscale artifact scores."""
+    laplacian_var: float
+    blocking_hf_ratio: float
+    ringing_energy: float
+    dark_variance: Optional[float]  # None when the frame has no dark region
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, matching cv2.dct / scipy norm='ortho'."""
+    k = np.arange(n).reshape(-1, 1)
+    x = np.arange(n).reshape(1, -1)
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0, :] = np.sqrt(1.0 / n)
+    return matrix
+
+
+_DCT8 = _dct_matrix(8)
+
+
+if HAS_NUMBA:
+    @njit(cache=True, inline="always")
+    def _reflect(i, n):
+        """Map an out-of-range index like OpenCV's BORDER_REFLECT_101."""
+        if i < 0:
+            return -i
+        if i >= n:
+            return 2 * n - 2 - i
+        return i
+    
+    # Serial on purpose: frames are already scored concurrently by a thread
+    # pool, and a parallel kernel entered from those threads can hang the
+    # interpreter at exit under Numba's TBB threading layer
+    @njit(fastmath=True, cache=True, nogil=True)
+    def _fused_filters(gray, dct):
+        """Compute all per-pixel and per-block statistics in one pass."""
+        h, w = gray.shape
+        laplacian = np.empty((h, w), np.float32)
+        edges = np.empty((h, w), np.float32)
+        high_pass = np.empty((h, w), np.float32)
+        local_var = np.empty((h, w), np.float32)
+        
+        for y in range(h):
+            ym = _reflect(y - 1, h)
+            yp = _reflect(y + 1, h)
+            for x in range(w):
+                xm = _reflect(x - 1, w)
+                xp = _reflect(x + 1, w)
+                
+                c = np.float32(gray[y, x])
+                n = np.float32(gray[ym, x])
+                s = np.float32(gray[yp, x])
+                wv = np.float32(gray[y, xm])
+                e = np.float32(gray[y, xp])
+                nw = np.float32(gray[ym, xm])
+                ne = np.float32(gray[ym, xp])
+                sw = np.float32(gray[yp, xm])
+                se = np.float32(gray[yp, xp])
+                
+                # cv2.Laplacian (ksize=1) aperture
+                laplacian[y, x] = n + s + wv + e - 4.0 * c
+                
+                # cv2.Sobel ksize=3 gradients and magnitude
+                gx = (ne + 2.0 * e + se) - (nw + 2.0 * wv + sw)
+                gy = (sw + 2.0 * s + se) - (nw + 2.0 * n + ne)
+                edges[y, x] = math.sqrt(gx * gx + gy * gy)
+                
+                # 3x3 8-neighbour high-pass
+                high_pass[y, x] = 8.0 * c - (n + s + wv + e + nw + ne + sw + se)
+                
+                # 5x5 box mean and mean of squares
+                acc = 0.0
+                acc_sq = 0.0
+                for dy in range(-2, 3):
+                    yy = _reflect(y + dy, h)
+                    for dx in range(-2, 3):
+                        v = np.float32(gray[yy, _reflect(x + dx, w)])
+                        acc += v
+                        acc_sq += v * v
+                mean = acc / 25.0
+                local_var[y, x] = acc_sq / 25.0 - mean * mean
+        
+        # Per 8x8 block ratio of high-frequency to total DCT energy
+        nby = h // 8
+        nbx = w // 8
+        ratios = np.zeros((nby, nbx), np.float64)
+        valid = np.zeros((nby, nbx), np.bool_)
+        for by in range(nby):
+            tmp = np.empty((8, 8), np.float64)
+            for bx in range(nbx):
+                y0 = by * 8
+                x0 = bx * 8
+                # tmp = C @ block
+                for u in range(8):
+                    for j in range(8):
+                        t = 0.0
+                        for k in range(8):
+                            t += dct[u, k] * gray[y0 + k, x0 + j]
+                        tmp[u, j] = t
+                # coefficients = tmp @ C.T
+                hf = 0.0
+                total = 0.0
+                for u in range(8):
+                    for v in range(8):
+                        d = 0.0
+                        for j in range(8):
+                            d += tmp[u, j] * dct[v, j]
+                        d = abs(d)
+                        total += d
+                        if u >= 4 and v >= 4:
+                            hf += d
+                if total > 0.0:
+                    ratios[by, bx] = hf / total
+                    valid[by, bx] = True
+        
+        return laplacian, edges, high_pass, local_var, ratios, valid
+
+
+def analyze_gray(gray: np.ndarray) -> GrayArtifactStats:
+    """
+    Compute blur, blocking, ringing and dark-detail statistics in one pass.
+    
+    Args:
+        gray: 2D uint8 grayscale frame (at least 3x3)
+    
+    Returns:
+        GrayArtifactStats with the raw values the detectors normalize
+    """
+    if not HAS_NUMBA:
+        raise RuntimeError("numba is not installed")
+    
+    gray = np.ascontiguousarray(gray, dtype=np.uint8)
+    laplacian, edges, high_pass, local_var, ratios, valid = _fused_filters(gray, _DCT8)
+    
+    laplacian_var = float(laplacian.var(dtype=np.float64))
+    blocking_hf_ratio = float(ratios[valid].mean()) if np.any(valid) else 0.0
+    
+    # Ringing: high-pass energy on the strongest 5% of edges
+    kth = int(0.95 * (edges.size - 1))
+    edge_mask = edges > np.partition(edges.ravel(), kth)[kth]
+    ringing_energy = float(np.abs(high_pass[edge_mask]).mean()) if np.any(edge_mask) else 0.0
+    
+    # Dark detail: local variance within the darkest 30% of pixels
+    dark_mask = gray < np.percentile(gray, 30)
+    dark_variance = float(local_var[dark_mask].mean()) if np.any(dark_mask) else None
+    
+    return GrayArtifactStats(
+        laplacian_var=laplacian_var,
+        blocking_hf_ratio=blocking_hf_ratio,
+        ringing_energy=ringing_energy,
+        dark_variance=dark_variance
+    )
@@ -1,12 +1,24 @@
 """Artifact and perceptual quality analysis tool."""
 
-import os
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
-from typing import Dict, Any, Optional
-from utils.ffmpeg import extract_frame, get_video_info, FFmpegError
+import scipy.fft
+from typing import Dict, Any, List, Optional, Tuple
+from utils.ffmpeg import (
+    extract_frames_raw,
+    extract_paired_frames,
+    get_video_info,
+    FFmpegError
+)
 from utils.parsing import get_video_stream, parse_duration
+from tools._artifacts_kernel import HAS_NUMBA, analyze_gray
+
+
+# 3x3 high-pass kernel used for ringing detection
+_HIGH_PASS_KERNEL = np.array([[-1, -1, -1],
+                              [-1,  8, -1],
+                              [-1, -1, -1]], dtype=np.float32)
 
 
 def analyze_artifacts(
@@ -27,8 +39,7 @@ def analyze_artifacts(
     
     try:
         if mode == "compare":
-            target_scores = _analyze_single_video(target)
-            reference_scores = _analyze_single_video(reference)
+            target_scores, reference_scores = _analyze_video_pair(target, reference)
             
             # Calculate deltas
             artifact_deltas = {}
@@ -71,11 +82,33 @@ def analyze_artifacts(
         raise FFmpegError(f"Failed to analyze artifacts: {str(e)}")
 
 
-def _analyze_single_video(path: str) -> Dict[str, Any]:
-    """Analyze artifacts for a single video."""
-    scores = {}
-    
-    # Extract sample frames for analysis
+def _analyze_video_pair(target: str, reference: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Analyze artifacts for a target/reference pair."""
+    target_times = _sample_times(target)
+    reference_times = _sample_times(reference)
+    
+    # Same duration means the same sample offsets, so both videos can be
+    # decoded and sampled by a single ffmpeg process
+    if target_times and target_times == reference_times:
+        try:
+            reference_frames, target_frames = extract_paired_frames(
+                reference, target, target_times
+            )
+        except FFmpegError:
+            reference_frames, target_frames = [], []
+        
+        if reference_frames and target_frames:
+            return _score_frames(target_frames), _score_frames(reference_frames)
+    
+    # Both videos are analyzed independently, so run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        target_future = executor.submit(_analyze_single_video, target)
+        reference_future = executor.submit(_analyze_single_video, reference)
+        return target_future.result(), reference_future.result()
+
+
+def _sample_times(path: str) -> List[float]:
+    """Return the timestamps sampled for artifact analysis."""
     info = get_video_info(path)
     video_stream = get_video_stream(info.get("streams", []))
     if not video_stream:
@@ -84,98 +117,91 @@ def _analyze_single_video(path: str) -> Dict[str, Any]:
     duration = parse_duration(info.get("format", {}).get("duration"))
     
     # Sample frames at 10%, 50%, 90% of duration
-    sample_times = [duration * 0.1, duration * 0.5, duration * 0.9]
-    
-    with tempfile.TemporaryDirectory() as tmpdir:
-        frame_paths = []
-        for t in sample_times:
-            if t < duration:
-                frame_path = os.path.join(tmpdir, f"frame_{t:.2f}.png")
-                try:
-                    extract_frame(path, t, frame_path)
-                    frame_paths.append(frame_path)
-                except:
-                    continue
-        
-        if not frame_paths:
-            raise FFmpegError("Failed to extract sample frames")
-        
-        # Analyze each frame and average
-        all_scores = {
-            "blur": [],
-            "blocking": [],
-            "ringing": [],
-            "banding": [],
-            "dark_detail_loss": []
-        }
-        
-        for frame_path in frame_paths:
-            frame = cv2.imread(frame_path)
-            if frame is None:
-                continue
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Blur detection (Laplacian variance)
-            blur_score = _detect_blur(gray)
-            all_scores["blur"].append(blur_score)
-            
-            # Blocking detection (DCT-based)
-            blocking_score = _detect_blocking(gray)
-            all_scores["blocking"].append(blocking_score)
-            
-            # Ringing detection (high-frequency edge analysis)
-            ringing_score = _detect_ringing(gray)
-            all_scores["ringing"].append(ringing_score)
-            
-            # Banding detection (color gradient analysis)
-            banding_risk = _detect_banding(frame)
-            all_scores["banding"].append(banding_risk)
-            
-            # Dark detail loss (histogram analysis)
-            dark_score = _detect_dark_detail_loss(gray)
-            all_scores["dark_detail_loss"].append(dark_score)
-        
-        # Average scores
-        for key, values in all_scores.items():
-            if values:
-                avg = np.mean(values)
-                if key == "banding":
-                    # Banding uses risk levels
-                    if avg < 0.3:
-                        level = "low"
-                    elif avg < 0.6:
-                        level = "medium"
-                    else:
-                        level = "high"
-                    scores[key] = {"risk": level}
-                else:
-                    # Other metrics use scores
-                    if avg < 0.3:
-                        level = "low"
-                    elif avg < 0.6:
-                        level = "medium"
-                    else:
-                        level = "high"
-                    
-                    scores[key] = {
-                        "score": round(float(avg), 3),
-                        "level": level,
-                        "description": _get_artifact_description(key, avg)
-                    }
+    return [t for t in (duration * 0.1, duration * 0.5, duration * 0.9) if t < duration]
+
+
+def _analyze_single_video(path: str) -> Dict[str, Any]:
+    """Analyze artifacts for a single video."""
+    sample_times = _sample_times(path)
+    
+    # Extract sample frames for analysis
+    try:
+        frames = extract_frames_raw(path, sample_times)
+    except FFmpegError:
+        frames = []
+    
+    return _score_frames(frames)
+
+
+def _score_frames(frames: List[np.ndarray]) -> Dict[str, Any]:
+    """Run the detectors on sampled frames and aggregate per-artifact scores."""
+    scores = {}
+    
+    if not frames:
+        raise FFmpegError("Failed to extract sample frames")
+    
+    with ThreadPoolExecutor(max_workers=min(8, len(frames))) as executor:
+        frame_results = list(executor.map(_analyze_frame, frames))
+    
+    # Analyze each frame and average: one row per detector, one column per frame
+    scores_arr = np.empty((len(_DETECTORS), len(frame_results)), dtype=np.float64)
+    for fi, frame_scores in enumerate(frame_results):
+        for di, (key, _, _) in enumerate(_DETECTORS):
+            scores_arr[di, fi] = frame_scores[key]
+    
+    averages = scores_arr.mean(axis=1)
+    
+    for (key, _, _), avg in zip(_DETECTORS, averages):
+        level = _score_level(avg)
+        if key == "banding":
+            # Banding uses risk levels
+            scores[key] = {"risk": level}
+        else:
+            # Other metrics use scores
+            scores[key] = {
+                "score": round(float(avg), 3),
+                "level": level,
+                "description": _get_artifact_description(key, avg)
+            }
     
     return scores
 
 
+def _analyze_frame(frame: np.ndarray) -> Dict[str, float]:
+    """Run all artifact detectors on a single extracted BGR frame."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    if HAS_NUMBA and min(gray.shape) >= 3:
+        # Fused single-pass kernel for the grayscale detectors
+        stats = analyze_gray(gray)
+        return {
+            "blur": _blur_score(stats.laplacian_var),
+            "blocking": _blocking_score(stats.blocking_hf_ratio),
+            "ringing": _ringing_score(stats.ringing_energy),
+            "banding": _detect_banding(frame),
+            "dark_detail_loss": (
+                _dark_detail_score(stats.dark_variance)
+                if stats.dark_variance is not None else 0.0
+            )
+        }
+    
+    return {
+        key: detector(frame if uses_color else gray)
+        for key, detector, uses_color in _DETECTORS
+    }
+
+
 def _detect_blur(gray: np.ndarray) -> float:
     """Detect blur using Laplacian variance."""
     laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    variance = laplacian.var()
-    
+    return _blur_score(laplacian.var())
+
+
+def _blur_score(laplacian_var: float) -> float:
+    """Normalize Laplacian variance to a 0-1 blur score."""
     # Normalize: lower variance = more blur
     # Typical range: 0-1000+, normalize to 0-1
-    normalized = 1.0 - min(variance / 500.0, 1.0)
-    return normalized
+    return 1.0 - min(laplacian_var / 500.0, 1.0)
 
 
 def _detect_blocking(gray: np.ndarray) -> float:
@@ -183,62 +209,65 @@ def _detect_blocking(gray: np.ndarray) -> float:
     # Divide into 8x8 blocks (typical macroblock size)
     h, w = gray.shape
     block_size = 8
+    h2 = (h // block_size) * block_size
+    w2 = (w // block_size) * block_size
+    if h2 == 0 or w2 == 0:
+        return 0.0
     
-    blocking_score = 0.0
-    block_count = 0
+    # Reshape into (rows, cols, 8, 8) blocks and transform them all at once
+    blocks = (
+        gray[:h2, :w2]
+        .astype(np.float32)
+        .reshape(h2 // block_size, block_size, w2 // block_size, block_size)
+        .transpose(0, 2, 1, 3)
+    )
+    dct_blocks = np.abs(scipy.fft.dctn(blocks, type=2, axes=(-2, -1), norm="ortho", workers=-1))
     
-    for y in range(0, h - block_size, block_size):
-        for x in range(0, w - block_size, block_size):
-            block = gray[y:y+block_size, x:x+block_size].astype(np.float32)
-            
-            # DCT
-            dct_block = cv2.dct(block)
-            
-            # High frequency energy (indicative of blocking)
-            # Focus on high-frequency coefficients
-            hf_energy = np.sum(np.abs(dct_block[4:, 4:]))
-            total_energy = np.sum(np.abs(dct_block))
-            
-            if total_energy > 0:
-                hf_ratio = hf_energy / total_energy
-                blocking_score += hf_ratio
-                block_count += 1
+    # High frequency energy (indicative of blocking)
+    # Focus on high-frequency coefficients
+    hf_energy = dct_blocks[..., 4:, 4:].sum(axis=(-2, -1))
+    total_energy = dct_blocks.sum(axis=(-2, -1))
     
-    if block_count > 0:
-        avg_score = blocking_score / block_count
-        # Normalize to 0-1 range
-        return min(avg_score * 2.0, 1.0)
+    valid = total_energy > 0
+    if np.any(valid):
+        return _blocking_score(float((hf_energy[valid] / total_energy[valid]).mean()))
     
     return 0.0
 
 
+def _blocking_score(hf_ratio: float) -> float:
+    """Normalize mean high-frequency DCT energy ratio to a 0-1 blocking score."""
+    return min(hf_ratio * 2.0, 1.0)
+
+
 def _detect_ringing(gray: np.ndarray) -> float:
     """Detect ringing artifacts near edges."""
-    # Apply Sobel to detect edges
-    sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-    edges = np.sqrt(sobelx**2 + sobely**2)
-    
-    # Threshold for strong edges
-    edge_threshold = np.percentile(edges, 95)
+    # Apply Sobel to detect edges (float32 halves memory traffic vs float64)
+    sobelx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    edges = cv2.magnitude(sobelx, sobely)
+    
+    # Threshold for strong edges (95th percentile via O(N) selection)
+    kth = int(0.95 * (edges.size - 1))
+    edge_threshold = np.partition(edges.ravel(), kth)[kth]
     edge_mask = edges > edge_threshold
     
     # Analyze oscillations near edges (ringing indicator)
     # Use high-pass filter
-    kernel = np.array([[-1, -1, -1],
-                       [-1,  8, -1],
-                       [-1, -1, -1]])
-    high_pass = cv2.filter2D(gray.astype(np.float32), -1, kernel)
+    high_pass = cv2.filter2D(gray, cv2.CV_32F, _HIGH_PASS_KERNEL)
     
     # Measure high-frequency energy near edges
     if np.any(edge_mask):
-        ringing_energy = np.mean(np.abs(high_pass[edge_mask]))
-        # Normalize
-        return min(ringing_energy / 50.0, 1.0)
+        return _ringing_score(float(np.mean(np.abs(high_pass[edge_mask]))))
     
     return 0.0
 
 
+def _ringing_score(ringing_energy: float) -> float:
+    """Normalize near-edge high-pass energy to a 0-1 ringing score."""
+    return min(ringing_energy / 50.0, 1.0)
+
+
 def _detect_banding(bgr: np.ndarray) -> float:
     """Detect color banding (posterization)."""
     # Convert to LAB color space for better gradient analysis
@@ -246,19 +275,20 @@ def _detect_banding(bgr: np.ndarray) -> float:
     l_channel = lab[:, :, 0]
     
     # Calculate gradients
-    grad_x = cv2.Sobel(l_channel, cv2.CV_64F, 1, 0, ksize=3)
-    grad_y = cv2.Sobel(l_channel, cv2.CV_64F, 0, 1, ksize=3)
-    gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+    grad_x = cv2.Sobel(l_channel, cv2.CV_32F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(l_channel, cv2.CV_32F, 0, 1, ksize=3)
+    gradient_magnitude = cv2.magnitude(grad_x, grad_y)
     
     # Banding shows as areas with very low gradient (flat regions)
     # but with sudden jumps (quantization)
     low_gradient_mask = gradient_magnitude < 5
     flat_regions = l_channel[low_gradient_mask]
     
-    if len(flat_regions) > 0:
+    if flat_regions.size > 0:
         # Check for quantization (few distinct values)
-        unique_values = len(np.unique(flat_regions))
-        total_pixels = len(flat_regions)
+        # L is uint8, so a 256-bin histogram replaces sorting with np.unique
+        unique_values = int(np.count_nonzero(np.bincount(flat_regions, minlength=256)))
+        total_pixels = flat_regions.size
         quantization_ratio = unique_values / total_pixels if total_pixels > 0 else 0
         
         # Lower ratio = more banding
@@ -277,19 +307,44 @@ def _detect_dark_detail_loss(gray: np.ndarray) -> float:
     if not np.any(dark_mask):
         return 0.0
     
-    dark_region = gray[dark_mask]
-    
-    # Calculate local variance in dark regions
+    # Calculate local variance in dark regions as E[X^2] - E[X]^2
     # Low variance = loss of detail
-    kernel = np.ones((5, 5), np.float32) / 25
-    local_mean = cv2.filter2D(gray.astype(np.float32), -1, kernel)
-    local_var = cv2.filter2D((gray.astype(np.float32) - local_mean)**2, -1, kernel)
-    
-    dark_variance = np.mean(local_var[dark_mask])
+    gray_f = gray.astype(np.float32)
+    local_mean = cv2.boxFilter(gray_f, -1, (5, 5))
+    local_mean_sq = cv2.boxFilter(gray_f * gray_f, -1, (5, 5))
+    local_var = local_mean_sq - local_mean * local_mean
     
+    return _dark_detail_score(float(np.mean(local_var[dark_mask])))
+
+
+def _dark_detail_score(dark_variance: float) -> float:
+    """Normalize dark-region local variance to a 0-1 detail loss score."""
     # Normalize: very low variance = high detail loss
-    normalized = 1.0 - min(dark_variance / 100.0, 1.0)
-    return normalized
+    return 1.0 - min(dark_variance / 100.0, 1.0)
+
+
+# (artifact key, detector, whether it takes the BGR frame instead of gray)
+_DETECTORS = [
+    # Blur detection (Laplacian variance)
+    ("blur", _detect_blur, False),
+    # Blocking detection (DCT-based)
+    ("blocking", _detect_blocking, False),
+    # Ringing detection (high-frequency edge analysis)
+    ("ringing", _detect_ringing, False),
+    # Banding detection (color gradient analysis)
+    ("banding", _detect_banding, True),
+    # Dark detail loss (histogram analysis)
+    ("dark_detail_loss", _detect_dark_detail_loss, False)
+]
+
+
+def _score_level(score: float) -> str:
+    """Classify a 0-1 artifact score as low, medium or high."""
+    if score < 0.3:
+        return "low"
+    elif score < 0.6:
+        return "medium"
+    return "high"
 
 
 def _get_artifact_description(artifact_type: str, score: float) -> str:
@@ -317,8 +372,7 @@ def _get_artifact_description(artifact_type: str, score: float) -> str:
         }
     }
     
-    level = "low" if score < 0.3 else "medium" if score < 0.6 else "high"
-    return descriptions.get(artifact_type, {}).get(level, "")
+    return descriptions.get(artifact_type, {}).get(_score_level(score), "")
 
 
 def _calculate_risk_summary(
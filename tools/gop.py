@@ -1,16 +1,24 @@
 """GOP structure analysis tool."""
 
-from typing import Dict, Any, List
-from utils.ffmpeg import get_frame_info, get_packets, FFmpegError
-from utils.parsing import parse_frame_type, parse_duration
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from utils.ffmpeg import get_frame_info, iter_video_packets, FFmpegError
+from utils.parsing import FRAME_TYPES, classify_frames, parse_duration
 
 
-def analyze_gop_structure(path: str) -> Dict[str, Any]:
+# Maximum number of keyframe timestamps included in the result
+_MAX_KEYFRAME_TIMESTAMPS = 100
+
+
+def analyze_gop_structure(path: str, packets_only: bool = False) -> Dict[str, Any]:
     """
     Analyze GOP structure and frame distribution.
     
     Args:
         path: Path to video file
+        packets_only: Derive GOPs from packet keyframe flags only. This reads
+            container metadata without decoding and is much faster, but
+            cannot distinguish P from B frames, so frame_distribution is None
         
     Returns:
         Dictionary containing frame distribution and GOP statistics
@@ -19,45 +27,16 @@ def analyze_gop_structure(path: str) -> Dict[str, Any]:
         FFmpegError: If video file cannot be analyzed
     """
     try:
-        # Get frame information
-        frames = get_frame_info(path)
+        frame_counts: Optional[Dict[str, int]] = None
         
-        # Count frame types
-        frame_counts = {"I": 0, "P": 0, "B": 0}
-        keyframe_timestamps = []
-        gop_lengths = []
-        current_gop = 0
-        
-        for frame in frames:
-            frame_type = parse_frame_type(frame.get("pict_type"))
-            if frame_type in frame_counts:
-                frame_counts[frame_type] += 1
-            
-            # Track keyframes and GOP lengths
-            if frame.get("key_frame") == 1 or frame_type == "I":
-                pts_time = parse_duration(frame.get("pkt_pts_time"))
-                if pts_time is not None and pts_time >= 0:
-                    keyframe_timestamps.append(round(pts_time, 3))
-                
-                if current_gop > 0:
-                    gop_lengths.append(current_gop)
-                current_gop = 1
-            else:
-                current_gop += 1
-        
-        # Add last GOP if video doesn't end with keyframe
-        if current_gop > 0:
-            gop_lengths.append(current_gop)
-        
-        # Calculate GOP statistics
-        if gop_lengths:
-            avg_gop = sum(gop_lengths) / len(gop_lengths)
-            min_gop = min(gop_lengths)
-            max_gop = max(gop_lengths)
+        if packets_only:
+            # Stream packets straight from ffprobe without decoding
+            gop_stats, keyframe_timestamps = _packet_gops(path)
         else:
-            avg_gop = 0
-            min_gop = 0
-            max_gop = 0
+            # Get frame information
+            frame_counts, gop_stats, keyframe_timestamps = _frame_gops(path)
+        
+        avg_gop, min_gop, max_gop = gop_stats
         
         result = {
             "frame_distribution": frame_counts,
@@ -66,7 +45,7 @@ def analyze_gop_structure(path: str) -> Dict[str, Any]:
                 "min_gop": min_gop,
                 "max_gop": max_gop
             },
-            "keyframe_timestamps": keyframe_timestamps[:100]  # Limit to first 100
+            "keyframe_timestamps": keyframe_timestamps
         }
         
         return result
@@ -76,3 +55,85 @@ def analyze_gop_structure(path: str) -> Dict[str, Any]:
     except Exception as e:
         raise FFmpegError(f"Failed to analyze GOP structure: {str(e)}")
 
+
+def _frame_gops(path: str) -> Tuple[Dict[str, int], Tuple[float, int, int], List[float]]:
+    """
+    Compute frame type counts, GOP (avg, min, max) lengths and keyframe
+    timestamps from decoded frame information, classifying all frames in
+    one batch.
+    """
+    frames = get_frame_info(path)
+    types, keyframes = classify_frames(frames)
+    
+    frame_counts = {
+        frame_type: int(np.count_nonzero(types == frame_type))
+        for frame_type in FRAME_TYPES
+    }
+    
+    keyframe_indices = np.flatnonzero(keyframes)
+    
+    # Each keyframe starts a GOP; frames before the first keyframe form one too
+    boundaries = np.concatenate(([0], keyframe_indices, [len(frames)]))
+    gop_lengths = np.diff(boundaries)
+    gop_lengths = gop_lengths[gop_lengths > 0]
+    if gop_lengths.size:
+        gop_stats = (float(gop_lengths.mean()), int(gop_lengths.min()), int(gop_lengths.max()))
+    else:
+        gop_stats = (0, 0, 0)
+    
+    # Only the first 100 keyframe timestamps are reported
+    keyframe_timestamps = []
+    for index in keyframe_indices:
+        if len(keyframe_timestamps) >= _MAX_KEYFRAME_TIMESTAMPS:
+            break
+        frame = frames[index]
+        pts_time = parse_duration(frame.get("pts_time") or frame.get("pkt_pts_time"))
+        if pts_time >= 0:
+            keyframe_timestamps.append(round(pts_time, 3))
+    
+    return frame_counts, gop_stats, keyframe_timestamps
+
+
+def _packet_gops(path: str) -> Tuple[Tuple[float, int, int], List[float]]:
+    """
+    Compute GOP (avg, min, max) lengths and keyframe timestamps from streamed
+    packet keyframe flags in a single pass, without holding the packet list
+    or the GOP lengths in memory.
+    """
+    keyframe_timestamps = []
+    current_gop = 0
+    
+    # GOP statistics are accumulated as each GOP closes
+    gop_total = 0
+    gop_count = 0
+    min_gop = 0
+    max_gop = 0
+    
+    for pts_time, is_keyframe in iter_video_packets(path):
+        if is_keyframe:
+            # Only the first 100 keyframe timestamps are reported
+            if len(keyframe_timestamps) < _MAX_KEYFRAME_TIMESTAMPS and pts_time >= 0:
+                keyframe_timestamps.append(round(pts_time, 3))
+            
+            if current_gop > 0:
+                gop_total += current_gop
+                gop_count += 1
+                if gop_count == 1 or current_gop < min_gop:
+                    min_gop = current_gop
+                if current_gop > max_gop:
+                    max_gop = current_gop
+            current_gop = 1
+        else:
+            current_gop += 1
+    
+    # Add last GOP if video doesn't end with keyframe
+    if current_gop > 0:
+        gop_total += current_gop
+        gop_count += 1
+        if gop_count == 1 or current_gop < min_gop:
+            min_gop = current_gop
+        if current_gop > max_gop:
+            max_gop = current_gop
+    
+    avg_gop = gop_total / gop_count if gop_count else 0
+    return (avg_gop, min_gop, max_gop), keyframe_timestamps
@@ -11,6 +11,20 @@ from utils.parsing import (
 )
 
 
+# Pixel format markers for high bit depth formats; anything else is 8-bit.
+# Matching on endian suffixes avoids false hits such as "yuv410p" or "nv12".
+_BIT_DEPTH_MAP = {
+    "p010": 10,
+    "p016": 16,
+    "10le": 10,
+    "10be": 10,
+    "12le": 12,
+    "12be": 12,
+    "16le": 16,
+    "16be": 16
+}
+
+
 def analyze_video_metadata(path: str) -> Dict[str, Any]:
     """
     Analyze video metadata and encoding information.
@@ -37,7 +51,7 @@ def analyze_video_metadata(path: str) -> Dict[str, Any]:
         # Parse format information
         duration = parse_duration(format_info.get("duration"))
         size = int(format_info.get("size", 0))
-        bitrate = parse_bitrate(format_info.get("bitrate"))
+        bitrate = parse_bitrate(format_info.get("bit_rate"))
         container = format_info.get("format_name", "unknown").split(",")[0]
         
         # Parse video stream information
@@ -50,14 +64,7 @@ def analyze_video_metadata(path: str) -> Dict[str, Any]:
         pix_fmt = video_stream.get("pix_fmt", "unknown")
         
         # Determine bit depth from pixel format
-        bit_depth = 8
-        if "10" in pix_fmt or "12" in pix_fmt or "16" in pix_fmt:
-            if "10" in pix_fmt:
-                bit_depth = 10
-            elif "12" in pix_fmt:
-                bit_depth = 12
-            elif "16" in pix_fmt:
-                bit_depth = 16
+        bit_depth = next((v for k, v in _BIT_DEPTH_MAP.items() if k in pix_fmt), 8)
         
         result = {
             "format": {
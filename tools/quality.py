@@ -1,21 +1,45 @@
 """Video quality metrics comparison tool."""
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any
 from utils.ffmpeg import (
-    calculate_psnr,
-    calculate_ssim,
+    calculate_all_metrics,
+    calculate_psnr_ssim,
     calculate_vmaf,
-    FFmpegError
+    has_cuda_vmaf,
+    FFmpegError,
+    FFmpegTimeoutError
 )
 
 
-def compare_quality_metrics(reference: str, distorted: str) -> Dict[str, Any]:
+# VMAF frame subsampling per quality preset
+QUALITY_PRESETS = {
+    "full": 1,
+    "fast": 5
+}
+
+
+def compare_quality_metrics(
+    reference: str,
+    distorted: str,
+    vmaf_subsample: int = 1,
+    quality_preset: str = "full"
+) -> Dict[str, Any]:
     """
     Compare quality metrics between reference and distorted video.
     
+    All three metrics are first computed from a single ffmpeg filtergraph
+    that decodes each input once. When FFmpeg can run VMAF on CUDA, or the
+    single graph fails (e.g. libvmaf is unavailable), VMAF and a combined
+    PSNR/SSIM pass run as separate ffmpeg processes concurrently instead.
+    
     Args:
         reference: Path to reference video
         distorted: Path to distorted/transcoded video
+        vmaf_subsample: Evaluate VMAF on every Nth frame only. Mean scores
+            stay representative; per-frame variance statistics degrade
+        quality_preset: "full" evaluates every frame; "fast" subsamples VMAF
+            for interactive previews. An explicit vmaf_subsample > 1 wins
         
     Returns:
         Dictionary containing PSNR, SSIM, and VMAF scores
@@ -23,47 +47,97 @@ def compare_quality_metrics(reference: str, distorted: str) -> Dict[str, Any]:
     Raises:
         FFmpegError: If comparison fails
     """
+    vmaf_subsample = _resolve_vmaf_subsample(quality_preset, vmaf_subsample)
+    
+    # With a CUDA-capable FFmpeg, GPU VMAF alongside CPU PSNR/SSIM beats
+    # the single CPU libvmaf pass
+    if has_cuda_vmaf():
+        return _compare_metrics_separately(reference, distorted, vmaf_subsample)
+    
+    try:
+        metrics = calculate_all_metrics(reference, distorted, subsample=vmaf_subsample)
+    except FFmpegTimeoutError as e:
+        # A separate VMAF pass would decode the same inputs again and time
+        # out too; report it and keep the cheaper PSNR/SSIM results
+        return _compare_psnr_ssim_only(reference, distorted, f"VMAF calculation failed: {str(e)}")
+    except FFmpegError:
+        return _compare_metrics_separately(reference, distorted, vmaf_subsample)
+    
+    return {
+        "psnr": _format_psnr(metrics["psnr"]),
+        "ssim": _format_ssim(metrics["ssim"]),
+        "vmaf": _format_vmaf(metrics["vmaf"])
+    }
+
+
+def _resolve_vmaf_subsample(quality_preset: str, vmaf_subsample: int = 1) -> int:
+    """
+    Resolve the VMAF subsampling interval from a preset and explicit value.
+    
+    Args:
+        quality_preset: "fast" or "full"
+        vmaf_subsample: Explicit interval; values above 1 override the preset
+        
+    Returns:
+        Frame subsampling interval (1 = every frame)
+        
+    Raises:
+        FFmpegError: If the preset is unknown
+    """
+    if quality_preset not in QUALITY_PRESETS:
+        raise FFmpegError(
+            f"Unknown quality preset: {quality_preset} "
+            f"(expected one of: {', '.join(QUALITY_PRESETS)})"
+        )
+    
+    if vmaf_subsample > 1:
+        return vmaf_subsample
+    
+    return QUALITY_PRESETS[quality_preset]
+
+
+def _compare_metrics_separately(
+    reference: str,
+    distorted: str,
+    vmaf_subsample: int = 1
+) -> Dict[str, Any]:
+    """Compute VMAF and PSNR/SSIM in separate ffmpeg processes, concurrently."""
     result = {
         "psnr": None,
         "ssim": None,
         "vmaf": None
     }
     
-    errors = []
+    formatters = {
+        "psnr": _format_psnr,
+        "ssim": _format_ssim,
+        "vmaf": _format_vmaf
+    }
+    metric_errors = {}
     
-    # Calculate PSNR
-    try:
-        psnr_result = calculate_psnr(reference, distorted)
-        result["psnr"] = {
-            "y": round(psnr_result["y"], 2),
-            "u": round(psnr_result["u"], 2),
-            "v": round(psnr_result["v"], 2)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Each task yields a tuple of values for its metric names; PSNR and
+        # SSIM share one decode of both inputs
+        tasks = {
+            executor.submit(calculate_psnr_ssim, reference, distorted): ("psnr", "ssim"),
+            executor.submit(
+                lambda: (calculate_vmaf(reference, distorted, subsample=vmaf_subsample),)
+            ): ("vmaf",)
         }
-    except FFmpegError as e:
-        errors.append(f"PSNR calculation failed: {str(e)}")
-    except Exception as e:
-        errors.append(f"PSNR calculation error: {str(e)}")
+        
+        for future in as_completed(tasks):
+            names = tasks[future]
+            label = "/".join(name.upper() for name in names)
+            try:
+                for name, value in zip(names, future.result()):
+                    result[name] = formatters[name](value)
+            except FFmpegError as e:
+                metric_errors[names] = f"{label} calculation failed: {str(e)}"
+            except Exception as e:
+                metric_errors[names] = f"{label} calculation error: {str(e)}"
     
-    # Calculate SSIM
-    try:
-        ssim_score = calculate_ssim(reference, distorted)
-        result["ssim"] = round(ssim_score, 4)
-    except FFmpegError as e:
-        errors.append(f"SSIM calculation failed: {str(e)}")
-    except Exception as e:
-        errors.append(f"SSIM calculation error: {str(e)}")
-    
-    # Calculate VMAF
-    try:
-        vmaf_result = calculate_vmaf(reference, distorted)
-        result["vmaf"] = {
-            "score": round(vmaf_result["score"], 2),
-            "model": vmaf_result["model"]
-        }
-    except FFmpegError as e:
-        errors.append(f"VMAF calculation failed: {str(e)}")
-    except Exception as e:
-        errors.append(f"VMAF calculation error: {str(e)}")
+    # Report errors in a stable order regardless of completion order
+    errors = [metric_errors[names] for names in (("psnr", "ssim"), ("vmaf",)) if names in metric_errors]
     
     # If all metrics failed, raise error
     if not result["psnr"] and not result["ssim"] and not result["vmaf"]:
@@ -75,3 +149,41 @@ def compare_quality_metrics(reference: str, distorted: str) -> Dict[str, Any]:
     
     return result
 
+
+def _compare_psnr_ssim_only(reference: str, distorted: str, vmaf_error: str) -> Dict[str, Any]:
+    """Compute PSNR/SSIM alone, reporting the VMAF failure as a warning."""
+    try:
+        psnr, ssim = calculate_psnr_ssim(reference, distorted)
+    except FFmpegError as e:
+        raise FFmpegError(
+            f"All quality metrics failed: PSNR/SSIM calculation failed: {str(e)}; {vmaf_error}"
+        )
+    
+    return {
+        "psnr": _format_psnr(psnr),
+        "ssim": _format_ssim(ssim),
+        "vmaf": None,
+        "warnings": [vmaf_error]
+    }
+
+
+def _format_psnr(psnr: Dict[str, float]) -> Dict[str, float]:
+    """Round PSNR components for output."""
+    return {
+        "y": round(psnr["y"], 2),
+        "u": round(psnr["u"], 2),
+        "v": round(psnr["v"], 2)
+    }
+
+
+def _format_ssim(ssim: float) -> float:
+    """Round SSIM score for output."""
+    return round(ssim, 4)
+
+
+def _format_vmaf(vmaf: Dict[str, Any]) -> Dict[str, Any]:
+    """Round VMAF score for output."""
+    return {
+        "score": round(vmaf["score"], 2),
+        "model": vmaf["model"]
+    }
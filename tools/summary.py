@@ -1,33 +1,94 @@
 """Transcode comparison summary tool."""
 
-from typing import Dict, Any, List
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence
 from tools.metadata import analyze_video_metadata
 from tools.quality import compare_quality_metrics
 from tools.artifacts import analyze_artifacts
 from utils.ffmpeg import FFmpegError
 
 
-def summarize_transcode_comparison(source: str, transcoded: str) -> Dict[str, Any]:
+# Verdict bands: a value below THRESHOLDS[i] maps to VERDICTS[i]; values at or
+# above the last threshold map to None and fall through to the next check
+_VMAF_DELTA_THRESHOLDS = (-10, -5, -2)
+_VMAF_DELTA_VERDICTS = ("error", "warning", "notice", None)
+_PSNR_Y_THRESHOLDS = (30, 35)
+_PSNR_Y_VERDICTS = ("warning", "notice", None)
+
+# Verdict for each overall artifact risk level
+_RISK_VERDICTS = {"high": "warning", "medium": "notice"}
+
+# Key issue description for each dominant artifact type
+_ISSUE_DESCRIPTIONS = {
+    "blur": "画面模糊，细节丢失",
+    "blocking": "宏块效应增强",
+    "ringing": "振铃伪影明显",
+    "banding": "色带现象",
+    "dark_detail_loss": "暗部细节明显丢失"
+}
+
+# Encoding recommendations per artifact, given when the artifact's delta
+# exceeds the threshold (None: whenever the artifact has a delta entry)
+_ARTIFACT_RECOMMENDATIONS = (
+    ("blocking", 0.2, ("降低 CRF 值（提高码率）", "调整量化参数，降低 QP")),
+    ("dark_detail_loss", 0.2, (
+        "放宽 VBV 缓冲区限制",
+        "启用 aq-mode=3（自适应量化）",
+        "调整暗部量化偏移"
+    )),
+    ("blur", 0.15, ("使用更保守的编码预设", "提高码率或降低 CRF")),
+    ("banding", None, ("增加色深（10-bit 编码）", "使用更精细的量化步长"))
+)
+
+# General recommendation for each likely cause, in output order
+_CAUSE_RECOMMENDATIONS = {
+    "码率不足": "提高目标码率",
+    "VBV 约束过紧": "放宽 VBV 缓冲区大小",
+    "量化参数偏高": "降低 CRF/QP 值"
+}
+
+_DEFAULT_RECOMMENDATION = "转码质量可接受，可进一步优化编码参数以平衡质量与码率"
+
+
+def summarize_transcode_comparison(
+    source: str,
+    transcoded: str,
+    vmaf_subsample: int = 1,
+    quality_preset: str = "full"
+) -> Dict[str, Any]:
     """
     Generate comprehensive transcode comparison summary.
     
     Args:
         source: Path to source video
         transcoded: Path to transcoded video
+        vmaf_subsample: Evaluate VMAF on every Nth frame only (1 = all frames)
+        quality_preset: "fast" for interactive verdicts, "full" for final reports
         
     Returns:
         Dictionary containing verdict, quality changes, issues, and recommendations
     """
     try:
-        # Get metadata for both videos
-        source_meta = analyze_video_metadata(source)
-        transcoded_meta = analyze_video_metadata(transcoded)
-        
-        # Calculate quality metrics
-        quality_metrics = compare_quality_metrics(source, transcoded)
-        
-        # Analyze artifacts
-        artifact_analysis = analyze_artifacts(transcoded, source)
+        # The analyses are independent and mostly wait on ffmpeg/ffprobe
+        # subprocesses, so run them concurrently
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            # Get metadata for both videos
+            source_meta_future = executor.submit(analyze_video_metadata, source)
+            transcoded_meta_future = executor.submit(analyze_video_metadata, transcoded)
+            
+            # Calculate quality metrics
+            quality_future = executor.submit(
+                compare_quality_metrics, source, transcoded, vmaf_subsample, quality_preset
+            )
+            
+            # Analyze artifacts
+            artifact_future = executor.submit(analyze_artifacts, transcoded, source)
+            
+            source_meta = source_meta_future.result()
+            transcoded_meta = transcoded_meta_future.result()
+            quality_metrics = quality_future.result()
+            artifact_analysis = artifact_future.result()
         
         # Calculate bitrate saving
         source_bitrate = source_meta["format"]["bitrate"]
@@ -94,53 +155,45 @@ def _determine_verdict(
     
     # Check VMAF
     if vmaf_delta is not None:
-        if vmaf_delta < -10:
-            return "error"
-        elif vmaf_delta < -5:
-            return "warning"
-        elif vmaf_delta < -2:
-            return "notice"
+        verdict = _band(vmaf_delta, _VMAF_DELTA_THRESHOLDS, _VMAF_DELTA_VERDICTS)
+        if verdict:
+            return verdict
     
     # Check risk level
-    if risk == "high":
-        return "warning"
-    elif risk == "medium":
-        return "notice"
+    if risk in _RISK_VERDICTS:
+        return _RISK_VERDICTS[risk]
     
     # Check PSNR if available
     if quality_metrics.get("psnr"):
-        psnr_y = quality_metrics["psnr"]["y"]
-        if psnr_y < 30:
-            return "warning"
-        elif psnr_y < 35:
-            return "notice"
+        verdict = _band(quality_metrics["psnr"]["y"], _PSNR_Y_THRESHOLDS, _PSNR_Y_VERDICTS)
+        if verdict:
+            return verdict
     
     return "acceptable"
 
 
+def _band(
+    value: float,
+    thresholds: Sequence[float],
+    verdicts: Sequence[Optional[str]]
+) -> Optional[str]:
+    """Look up the verdict band of value in sorted thresholds."""
+    return verdicts[bisect_right(thresholds, value)]
+
+
 def _extract_key_issues(
     artifact_analysis: Dict[str, Any],
     quality_metrics: Dict[str, Any]
 ) -> List[str]:
     """Extract key issues from analysis."""
-    issues = []
-    
     # From artifact analysis
     risk_summary = artifact_analysis.get("risk_summary", {})
     dominant_issues = risk_summary.get("dominant_issues", [])
     
-    issue_descriptions = {
-        "blur": "画面模糊，细节丢失",
-        "blocking": "宏块效应增强",
-        "ringing": "振铃伪影明显",
-        "banding": "色带现象",
-        "dark_detail_loss": "暗部细节明显丢失"
-    }
-    
-    for issue in dominant_issues:
-        desc = issue_descriptions.get(issue, issue)
-        if desc not in issues:
-            issues.append(desc)
+    # dict.fromkeys drops duplicate descriptions while keeping their order
+    issues = list(dict.fromkeys(
+        _ISSUE_DESCRIPTIONS.get(issue, issue) for issue in dominant_issues
+    ))
     
     # From quality metrics
     if quality_metrics.get("psnr"):
@@ -170,50 +223,22 @@ def _generate_recommendations(
     risk_summary = artifact_analysis.get("risk_summary", {})
     likely_causes = risk_summary.get("likely_causes", [])
     
-    # Blocking issues
-    if "blocking" in artifact_deltas:
-        delta = artifact_deltas["blocking"].get("delta", 0)
-        if delta > 0.2:
-            recommendations.append("降低 CRF 值（提高码率）")
-            recommendations.append("调整量化参数，降低 QP")
-    
-    # Dark detail loss
-    if "dark_detail_loss" in artifact_deltas:
-        delta = artifact_deltas["dark_detail_loss"].get("delta", 0)
-        if delta > 0.2:
-            recommendations.append("放宽 VBV 缓冲区限制")
-            recommendations.append("启用 aq-mode=3（自适应量化）")
-            recommendations.append("调整暗部量化偏移")
-    
-    # Blur issues
-    if "blur" in artifact_deltas:
-        delta = artifact_deltas["blur"].get("delta", 0)
-        if delta > 0.15:
-            recommendations.append("使用更保守的编码预设")
-            recommendations.append("提高码率或降低 CRF")
-    
-    # Banding issues
-    if "banding" in artifact_deltas:
-        recommendations.append("增加色深（10-bit 编码）")
-        recommendations.append("使用更精细的量化步长")
+    # Artifact-specific recommendations
+    for artifact, threshold, artifact_recs in _ARTIFACT_RECOMMENDATIONS:
+        if artifact not in artifact_deltas:
+            continue
+        if threshold is None or artifact_deltas[artifact].get("delta", 0) > threshold:
+            recommendations.extend(artifact_recs)
     
     # General recommendations based on causes
-    if "码率不足" in likely_causes:
-        recommendations.append("提高目标码率")
-    if "VBV 约束过紧" in likely_causes:
-        recommendations.append("放宽 VBV 缓冲区大小")
-    if "量化参数偏高" in likely_causes:
-        recommendations.append("降低 CRF/QP 值")
+    for cause, rec in _CAUSE_RECOMMENDATIONS.items():
+        if cause in likely_causes:
+            recommendations.append(rec)
     
     # If no specific issues, provide general advice
     if not recommendations:
-        recommendations.append("转码质量可接受，可进一步优化编码参数以平衡质量与码率")
-    
-    # Remove duplicates and limit
-    unique_recs = []
-    for rec in recommendations:
-        if rec not in unique_recs:
-            unique_recs.append(rec)
+        recommendations.append(_DEFAULT_RECOMMENDATION)
     
-    return unique_recs[:5]  # Limit to 5 recommendations
+    # Remove duplicates (keeping order) and limit to 5 recommendations
+    return list(dict.fromkeys(recommendations))[:5]
 
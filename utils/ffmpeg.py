@@ -1,9 +1,78 @@
 """FFmpeg and ffprobe command wrapper utilities."""
 
+import functools
+import hashlib
 import json
+import mmap
 import subprocess
 import os
-from typing import Dict, List, Optional, Any, Tuple
+import re
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Any, Tuple
+import numpy as np
+from utils import probe_cache
+from utils.parsing import (
+    get_video_stream,
+    parse_duration,
+    parse_fps,
+    parse_json,
+    parse_keyframe_flag
+)
+
+
+# Pipe buffer size for captured ffmpeg/ffprobe output; frame and packet
+# JSON dumps run to several megabytes
+_PIPE_BUFSIZE = 1 << 20
+
+# Trailing stderr kept by run_command for error messages, read in chunks
+_STDERR_TAIL_BYTES = 8192
+_STDERR_CHUNK_SIZE = 4096
+
+# Executables resolved against PATH once at import instead of on every
+# command; the bare names are kept when not found so run_command still
+# reports the missing binary
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+# Set VQ_MCP_HWACCEL=0 to force software decoding in metric calculations
+HWACCEL_ENV = "VQ_MCP_HWACCEL"
+
+# stderr messages of hardware decoder setup failures, which warrant a retry
+# with software decoding
+_HWACCEL_ERROR_RE = re.compile(
+    rb"hwaccel|hw_?device|hw surface|hardware|device (?:creation|setup)|no device",
+    re.IGNORECASE
+)
+
+# Keep ffmpeg's stderr to actual errors: no banner, progress or info lines
+_QUIET_ARGS = ["-hide_banner", "-nostats", "-loglevel", "error"]
+
+# ffprobe -show_entries selections: only the fields the tools actually read,
+# which keeps the JSON (and the probe cache) small. Frames request both
+# pts_time (FFmpeg 5+) and pkt_pts_time (older releases).
+_VIDEO_INFO_ENTRIES = (
+    "format=duration,size,bit_rate,format_name"
+    ":stream=codec_type,codec_name,profile,level,width,height,r_frame_rate,pix_fmt"
+)
+_FRAME_ENTRIES = "frame=pict_type,key_frame,pts_time,pkt_pts_time"
+_PACKET_ENTRIES = "packet=pts_time,flags,size"
+
+# Bytes per pixel for the raw formats extract_frames_raw can emit
+_RAW_CHANNELS = {"gray": 1, "bgr24": 3}
+
+# Pixel formats libvmaf reads natively
+_VMAF_PIX_FMTS = {
+    "yuv420p", "yuv422p", "yuv444p",
+    "yuv420p10le", "yuv422p10le", "yuv444p10le"
+}
+
+# Per-frame lines of the psnr and ssim filter stats files, e.g.
+# "n:1 mse_avg:3.86 ... psnr_y:41.32 psnr_u:44.85 psnr_v:45.71"
+# "n:1 Y:0.983 U:0.985 V:0.987 All:0.984 (17.9)"
+_PSNR_LINE_RE = re.compile(rb"psnr_y:(\S+)\s+psnr_u:(\S+)\s+psnr_v:(\S+)")
+_SSIM_LINE_RE = re.compile(rb"All:(\S+)")
 
 
 class FFmpegError(Exception):
@@ -11,70 +80,209 @@ class FFmpegError(Exception):
     pass
 
 
-def run_command(cmd: List[str], timeout: Optional[int] = None) -> Tuple[str, str]:
+class FFmpegTimeoutError(FFmpegError):
+    """Raised when an FFmpeg/ffprobe command exceeds its timeout."""
+    pass
+
+
+class FFmpegCommandError(FFmpegError):
+    """Raised when an FFmpeg/ffprobe command exits with an error status."""
+    
+    def __init__(self, message: str, stderr: bytes = b""):
+        super().__init__(message)
+        self.stderr = stderr
+
+
+def run_command(cmd: List[str], timeout: Optional[int] = None) -> Tuple[bytes, bytes]:
     """
     Execute a command and return stdout and stderr.
     
+    Output is captured as raw bytes; callers decode only what they need, so
+    large JSON or rawvideo output is never run through a UTF-8 decode pass.
+    Only the tail of stderr is kept, so a command that logs heavily cannot
+    grow memory or error messages without bound.
+    
     Args:
         cmd: Command and arguments as a list
         timeout: Optional timeout in seconds
         
     Returns:
-        Tuple of (stdout, stderr)
+        Tuple of (stdout, last bytes of stderr)
         
     Raises:
         FFmpegError: If command execution fails
     """
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            check=False
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=_PIPE_BUFSIZE
         )
-        
-        if result.returncode != 0:
-            raise FFmpegError(
-                f"Command failed with return code {result.returncode}:\n"
-                f"Command: {' '.join(cmd)}\n"
-                f"Stderr: {result.stderr}"
-            )
-        
-        return result.stdout, result.stderr
-    except subprocess.TimeoutExpired as e:
-        raise FFmpegError(f"Command timed out after {timeout}s: {' '.join(cmd)}")
     except FileNotFoundError:
         raise FFmpegError("FFmpeg/ffprobe not found. Please ensure it's installed and in PATH.")
+    
+    stdout_chunks: List[bytes] = []
+    
+    def _drain_stdout() -> None:
+        with proc.stdout:
+            stdout_chunks.append(proc.stdout.read())
+    
+    stderr = _wait_for_process(proc, cmd, timeout, [_drain_stdout])
+    return b"".join(stdout_chunks), stderr
 
 
-def get_video_info(path: str) -> Dict[str, Any]:
+def _drain_tail(stream: BinaryIO, tail: bytearray) -> None:
+    """Read a pipe to EOF in fixed-size chunks, keeping only its last bytes."""
+    with stream:
+        for chunk in iter(lambda: stream.read(_STDERR_CHUNK_SIZE), b""):
+            tail += chunk
+            if len(tail) > _STDERR_TAIL_BYTES:
+                del tail[:-_STDERR_TAIL_BYTES]
+
+
+def _wait_for_process(
+    proc: subprocess.Popen,
+    cmd: List[str],
+    timeout: Optional[int],
+    readers: List[Callable[[], None]]
+) -> bytes:
     """
-    Get comprehensive video information using ffprobe.
+    Wait for a started process while draining its pipes.
+    
+    The stderr pipe is read in fixed-size chunks and only its last
+    _STDERR_TAIL_BYTES are kept; ffmpeg separates progress updates with
+    carriage returns, so line-based limits do not bound memory.
+    
+    Args:
+        proc: Process started with stderr=subprocess.PIPE
+        cmd: Command line, for error messages
+        timeout: Optional timeout in seconds
+        readers: Callables draining the process's other output pipes; each
+            runs in its own thread so no pipe can fill up and block the child
+        
+    Returns:
+        Tail of stderr as bytes
+        
+    Raises:
+        FFmpegTimeoutError: If the command times out
+        FFmpegCommandError: If the command exits with an error
+    """
+    stderr_tail = bytearray()
+    threads = [
+        threading.Thread(target=target, daemon=True)
+        for target in [*readers, functools.partial(_drain_tail, proc.stderr, stderr_tail)]
+    ]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise FFmpegTimeoutError(f"Command timed out after {timeout}s: {' '.join(cmd)}")
+    finally:
+        for thread in threads:
+            thread.join()
+    
+    stderr = bytes(stderr_tail)
+    
+    if proc.returncode != 0:
+        raise FFmpegCommandError(
+            f"Command failed with return code {proc.returncode}:\n"
+            f"Command: {' '.join(cmd)}\n"
+            f"Stderr: {stderr.decode('utf-8', errors='replace')}",
+            stderr
+        )
+    
+    return stderr
+
+
+def _file_cache_key(path: str) -> Tuple[str, int, int]:
+    """Build a cache key that changes whenever the file is modified."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _probe(path: str, kind: str) -> Any:
+    """
+    Return a cached ffprobe result for path.
     
     Args:
         path: Path to video file
+        kind: Probe type, one of the keys of _PROBES
         
     Returns:
-        Dictionary containing format and stream information
+        Parsed probe result, shared between callers
+        
+    Raises:
+        FFmpegError: If the file does not exist or ffprobe fails
     """
     if not os.path.exists(path):
         raise FFmpegError(f"Video file not found: {path}")
     
+    return _probe_cached(_file_cache_key(path), kind)
+
+
+@functools.lru_cache(maxsize=64)
+def _probe_cached(cache_key: Tuple[str, int, int], kind: str) -> Any:
+    """Memoize probe results per (abspath, st_mtime_ns, st_size) and kind."""
+    path, mtime_ns, size = cache_key
+    probe, entries = _PROBES[kind]
+    return probe_cache.cached_probe(
+        path, mtime_ns, size, _versioned_kind(kind, entries), lambda: probe(path)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _versioned_kind(kind: str, entries: str) -> str:
+    """
+    Tag a probe kind with a digest of its -show_entries selection.
+    
+    Changing the selected fields then changes the on-disk cache key, so rows
+    written with a different field set are never served.
+    """
+    digest = hashlib.sha1(entries.encode("utf-8")).hexdigest()[:12]
+    return f"{kind}:{digest}"
+
+
+def get_video_info(path: str) -> Dict[str, Any]:
+    """
+    Get comprehensive video information using ffprobe.
+    
+    Results are cached per (path, mtime, size) in memory and in the on-disk
+    probe cache, so repeated probes of the same file, even across server
+    restarts, do not spawn a new ffprobe process. The returned dictionary is
+    shared between callers and must not be mutated.
+    
+    Args:
+        path: Path to video file
+        
+    Returns:
+        Dictionary containing the format and stream fields selected by
+        _VIDEO_INFO_ENTRIES
+    """
+    return _probe(path, "video_info")
+
+
+def _get_video_info_uncached(path: str) -> Dict[str, Any]:
+    """Run ffprobe for format and stream information without caching."""
     cmd = [
-        "ffprobe",
+        FFPROBE,
         "-v", "quiet",
+        "-threads", "0",
         "-print_format", "json",
-        "-show_format",
-        "-show_streams",
+        "-show_entries", _VIDEO_INFO_ENTRIES,
         path
     ]
     
     stdout, _ = run_command(cmd, timeout=60)
     
     try:
-        return json.loads(stdout)
-    except json.JSONDecodeError as e:
+        return parse_json(stdout)
+    except ValueError as e:
         raise FFmpegError(f"Failed to parse ffprobe output: {e}")
 
 
@@ -82,20 +290,26 @@ def get_frame_info(path: str) -> List[Dict[str, Any]]:
     """
     Get frame-by-frame information including frame types.
     
+    Results are cached per (path, mtime, size) like get_video_info. The
+    returned list is shared between callers and must not be mutated.
+    
     Args:
         path: Path to video file
         
     Returns:
         List of frame dictionaries with type, pts, etc.
     """
-    if not os.path.exists(path):
-        raise FFmpegError(f"Video file not found: {path}")
-    
+    return _probe(path, "frame_info")
+
+
+def _get_frame_info_uncached(path: str) -> List[Dict[str, Any]]:
+    """Run ffprobe for per-frame information without caching."""
     cmd = [
-        "ffprobe",
+        FFPROBE,
         "-v", "quiet",
+        "-threads", "0",
         "-print_format", "json",
-        "-show_frames",
+        "-show_entries", _FRAME_ENTRIES,
         "-select_streams", "v:0",
         path
     ]
@@ -103,9 +317,9 @@ def get_frame_info(path: str) -> List[Dict[str, Any]]:
     stdout, _ = run_command(cmd, timeout=120)
     
     try:
-        data = json.loads(stdout)
+        data = parse_json(stdout)
         return data.get("frames", [])
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         raise FFmpegError(f"Failed to parse frame info: {e}")
 
 
@@ -113,20 +327,25 @@ def get_packets(path: str) -> List[Dict[str, Any]]:
     """
     Get packet information including keyframe flags.
     
+    Results are cached per (path, mtime, size) like get_video_info. The
+    returned list is shared between callers and must not be mutated.
+    
     Args:
         path: Path to video file
         
     Returns:
         List of packet dictionaries
     """
-    if not os.path.exists(path):
-        raise FFmpegError(f"Video file not found: {path}")
-    
+    return _probe(path, "packets")
+
+
+def _get_packets_uncached(path: str) -> List[Dict[str, Any]]:
+    """Run ffprobe for per-packet information without caching."""
     cmd = [
-        "ffprobe",
+        FFPROBE,
         "-v", "quiet",
         "-print_format", "json",
-        "-show_packets",
+        "-show_entries", _PACKET_ENTRIES,
         "-select_streams", "v:0",
         path
     ]
@@ -134,12 +353,78 @@ def get_packets(path: str) -> List[Dict[str, Any]]:
     stdout, _ = run_command(cmd, timeout=120)
     
     try:
-        data = json.loads(stdout)
+        data = parse_json(stdout)
         return data.get("packets", [])
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         raise FFmpegError(f"Failed to parse packet info: {e}")
 
 
+# Uncached probe implementations behind _probe and their -show_entries
+# selections, by cache kind
+_PROBES = {
+    "video_info": (_get_video_info_uncached, _VIDEO_INFO_ENTRIES),
+    "frame_info": (_get_frame_info_uncached, _FRAME_ENTRIES),
+    "packets": (_get_packets_uncached, _PACKET_ENTRIES),
+}
+
+
+def iter_video_packets(path: str) -> Iterator[Tuple[float, bool]]:
+    """
+    Stream video packet timestamps and keyframe flags.
+    
+    Only container metadata is read (no decoding), and ffprobe's CSV output
+    is parsed line by line as it is produced, so memory stays constant
+    regardless of video length.
+    
+    Args:
+        path: Path to video file
+        
+    Yields:
+        Tuples of (pts_time in seconds, is_keyframe)
+        
+    Raises:
+        FFmpegError: If ffprobe cannot be run or exits with an error
+    """
+    if not os.path.exists(path):
+        raise FFmpegError(f"Video file not found: {path}")
+    
+    cmd = [
+        FFPROBE,
+        "-v", "quiet",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path
+    ]
+    
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+    except FileNotFoundError:
+        raise FFmpegError("FFmpeg/ffprobe not found. Please ensure it's installed and in PATH.")
+    
+    try:
+        for line in proc.stdout:
+            pts_time, _, flags = line.strip().partition(",")
+            yield parse_duration(pts_time), parse_keyframe_flag(flags)
+        
+        returncode = proc.wait()
+        if returncode != 0:
+            raise FFmpegError(
+                f"Command failed with return code {returncode}:\n"
+                f"Command: {' '.join(cmd)}"
+            )
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
 def extract_frame(path: str, timestamp: float, output_path: str) -> str:
     """
     Extract a single frame at specified timestamp.
@@ -156,7 +441,7 @@ def extract_frame(path: str, timestamp: float, output_path: str) -> str:
         raise FFmpegError(f"Video file not found: {path}")
     
     cmd = [
-        "ffmpeg",
+        FFMPEG,
         "-i", path,
         "-ss", str(timestamp),
         "-vframes", "1",
@@ -172,6 +457,335 @@ def extract_frame(path: str, timestamp: float, output_path: str) -> str:
     return output_path
 
 
+def _raw_frame_filter(path: str, timestamps: List[float], max_width: Optional[int]) -> Tuple[str, int, int]:
+    """
+    Build the select/scale filter chain for raw frame extraction.
+    
+    Returns:
+        Tuple of (filter chain, output width, output height); the chain is
+        empty when there is nothing to select
+    """
+    if not os.path.exists(path):
+        raise FFmpegError(f"Video file not found: {path}")
+    
+    info = get_video_info(path)
+    video_stream = get_video_stream(info.get("streams", []))
+    if not video_stream:
+        raise FFmpegError("No video stream found")
+    
+    fps = parse_fps(video_stream.get("r_frame_rate"))
+    if fps <= 0:
+        raise FFmpegError(f"Unable to determine frame rate: {path}")
+    
+    width = int(video_stream.get("width", 0))
+    height = int(video_stream.get("height", 0))
+    if width <= 0 or height <= 0:
+        raise FFmpegError(f"Unable to determine frame size: {path}")
+    
+    # Compute the output size up front so the raw stream can be split
+    if max_width and width > max_width:
+        height = max(2, int(height * max_width / width) // 2 * 2)
+        width = max_width
+    
+    indices = sorted({int(ts * fps) for ts in timestamps})
+    if not indices:
+        return "", width, height
+    
+    select_expr = "+".join(f"eq(n,{n})" for n in indices)
+    return f"select='{select_expr}',scale={width}:{height},setpts=N/TB", width, height
+
+
+def _split_raw_frames(data: bytes, width: int, height: int, pix_fmt: str) -> List[np.ndarray]:
+    """Split a rawvideo byte stream into per-frame uint8 arrays."""
+    channels = _RAW_CHANNELS[pix_fmt]
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    frame_size = width * height * channels
+    
+    return [
+        np.frombuffer(data, dtype=np.uint8, count=frame_size, offset=i * frame_size).reshape(shape)
+        for i in range(len(data) // frame_size)
+    ]
+
+
+def extract_frames_raw(
+    path: str,
+    timestamps: List[float],
+    max_width: Optional[int] = 1280,
+    pix_fmt: str = "bgr24"
+) -> List[np.ndarray]:
+    """
+    Extract frames at several timestamps as raw pixel arrays.
+    
+    Timestamps are converted to frame indices using the stream frame rate and
+    selected in one decode pass, instead of spawning one process per frame.
+    Frames are piped back as rawvideo, skipping the PNG encode/decode and
+    temporary files. Frames wider than max_width are downscaled (keeping
+    aspect ratio) so analysis cost does not grow with source resolution.
+    
+    Args:
+        path: Input video path
+        timestamps: Timestamps in seconds
+        max_width: Maximum output width, or None to keep full resolution
+        pix_fmt: Output pixel format, "bgr24" or "gray"
+        
+    Returns:
+        List of uint8 arrays shaped (h, w, 3) for bgr24 or (h, w) for gray
+    """
+    if pix_fmt not in _RAW_CHANNELS:
+        raise FFmpegError(f"Unsupported raw pixel format: {pix_fmt}")
+    
+    vf, width, height = _raw_frame_filter(path, timestamps, max_width)
+    if not vf:
+        return []
+    
+    # Keep the coded orientation: the output size is computed from the coded
+    # dimensions, and the detectors do not depend on orientation
+    cmd = [
+        FFMPEG,
+        *_QUIET_ARGS,
+        "-noautorotate", "-i", path,
+        "-vf", vf,
+        "-vsync", "0",
+        "-pix_fmt", pix_fmt,
+        "-f", "rawvideo",
+        "-"
+    ]
+    
+    stdout, _ = run_command(cmd, timeout=120)
+    
+    frames = _split_raw_frames(stdout, width, height, pix_fmt)
+    if not frames:
+        raise FFmpegError(f"Failed to extract frames from {path}")
+    
+    return frames
+
+
+def extract_paired_frames(
+    reference: str,
+    distorted: str,
+    timestamps: List[float],
+    max_width: Optional[int] = 1280,
+    pix_fmt: str = "bgr24"
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Extract frames at the same timestamps from two videos in one ffmpeg run.
+    
+    Both inputs are decoded, selected and scaled by a single filtergraph whose
+    two outputs are written as rawvideo to separate pipes. Requires POSIX
+    file descriptor inheritance; on other platforms use extract_frames_raw.
+    
+    Args:
+        reference: Reference video path
+        distorted: Distorted video path
+        timestamps: Timestamps in seconds, shared by both videos
+        max_width: Maximum output width, or None to keep full resolution
+        pix_fmt: Output pixel format, "bgr24" or "gray"
+        
+    Returns:
+        Tuple of (reference frames, distorted frames)
+    """
+    if os.name != "posix":
+        raise FFmpegError("Paired frame extraction requires a POSIX platform")
+    if pix_fmt not in _RAW_CHANNELS:
+        raise FFmpegError(f"Unsupported raw pixel format: {pix_fmt}")
+    
+    ref_vf, ref_w, ref_h = _raw_frame_filter(reference, timestamps, max_width)
+    dist_vf, dist_w, dist_h = _raw_frame_filter(distorted, timestamps, max_width)
+    if not ref_vf or not dist_vf:
+        return [], []
+    
+    ref_read, ref_write = os.pipe()
+    dist_read, dist_write = os.pipe()
+    
+    # Coded orientation, as in extract_frames_raw
+    cmd = [
+        FFMPEG,
+        *_QUIET_ARGS,
+        "-noautorotate", "-i", reference,
+        "-noautorotate", "-i", distorted,
+        "-filter_complex", f"[0:v]{ref_vf}[ref];[1:v]{dist_vf}[dist]",
+        "-vsync", "0",
+        "-map", "[ref]", "-pix_fmt", pix_fmt, "-f", "rawvideo", f"pipe:{ref_write}",
+        "-map", "[dist]", "-pix_fmt", pix_fmt, "-f", "rawvideo", f"pipe:{dist_write}"
+    ]
+    
+    outputs: Dict[int, bytes] = {}
+    
+    def _drain(fd: int) -> None:
+        with os.fdopen(fd, "rb") as stream:
+            outputs[fd] = stream.read()
+    
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            pass_fds=(ref_write, dist_write)
+        )
+    except FileNotFoundError:
+        os.close(ref_read)
+        os.close(dist_read)
+        raise FFmpegError("FFmpeg/ffprobe not found. Please ensure it's installed and in PATH.")
+    finally:
+        # The child holds its own copies of the write ends
+        os.close(ref_write)
+        os.close(dist_write)
+    
+    # Both pipes must be drained concurrently or ffmpeg blocks on a full one
+    _wait_for_process(
+        proc, cmd, 120,
+        [functools.partial(_drain, fd) for fd in (ref_read, dist_read)]
+    )
+    
+    ref_frames = _split_raw_frames(outputs.get(ref_read, b""), ref_w, ref_h, pix_fmt)
+    dist_frames = _split_raw_frames(outputs.get(dist_read, b""), dist_w, dist_h, pix_fmt)
+    if not ref_frames or not dist_frames:
+        raise FFmpegError("Failed to extract paired frames")
+    
+    return ref_frames, dist_frames
+
+
+def _iter_stats_matches(log_path: str, pattern: re.Pattern) -> Iterator[re.Match]:
+    """
+    Yield every match of pattern in a filter stats file.
+    
+    The file is memory-mapped and scanned by the regex engine in one pass,
+    so memory use is constant and no per-line str objects are created.
+    """
+    with open(log_path, "rb") as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from pattern.finditer(mm)
+
+
+def _parse_psnr_log(log_path: str) -> Dict[str, float]:
+    """
+    Average per-frame Y/U/V PSNR from a psnr filter stats file.
+    
+    Per-frame infinite PSNR (identical frames) is capped at 100 dB.
+    """
+    totals = [0.0, 0.0, 0.0]
+    count = 0
+    
+    for match in _iter_stats_matches(log_path, _PSNR_LINE_RE):
+        for i in range(3):
+            totals[i] += min(float(match.group(i + 1)), 100.0)
+        count += 1
+    
+    if not count:
+        raise FFmpegError("Failed to parse PSNR output")
+    
+    return {
+        "y": totals[0] / count,
+        "u": totals[1] / count,
+        "v": totals[2] / count
+    }
+
+
+def _parse_ssim_log(log_path: str) -> float:
+    """Average the per-frame combined ("All") SSIM from a ssim filter stats file."""
+    total = 0.0
+    count = 0
+    
+    for match in _iter_stats_matches(log_path, _SSIM_LINE_RE):
+        total += float(match.group(1))
+        count += 1
+    
+    if not count:
+        raise FFmpegError("Failed to parse SSIM output")
+    
+    return total / count
+
+
+def _filter_path(path: str) -> str:
+    """
+    Escape a file path for use as a filter option value in a filtergraph.
+    
+    Filtergraphs are unescaped twice: once for the graph description, where
+    [ ] , ; separate filters, and once for the option string, where :
+    separates options. Both levels treat \\ and ' as escape characters.
+    Escaping for both keeps Windows paths (C:\\...) and temp directories
+    containing these characters intact.
+    """
+    value = re.sub(r"([\\':])", r"\\\1", path)
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+
+def _metric_inputs(
+    distorted: str,
+    reference: str,
+    input_args: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Build the input arguments of a metric command, distorted video first.
+    
+    Args:
+        distorted: Distorted video path
+        reference: Reference video path
+        input_args: Extra options placed before each -i (e.g. hwaccel)
+        
+    Returns:
+        ffmpeg arguments for both inputs with automatic decoder threading
+    """
+    args: List[str] = []
+    for path in (distorted, reference):
+        args += [*(input_args or []), "-threads", "0", "-i", path]
+    return args
+
+
+def hwaccel_enabled() -> bool:
+    """Return False when hardware decoding is disabled via environment."""
+    return os.environ.get(HWACCEL_ENV, "").lower() not in ("0", "false", "no")
+
+
+def _run_metric_command(
+    distorted: str,
+    reference: str,
+    output_args: List[str],
+    timeout: int
+) -> None:
+    """
+    Run a metric ffmpeg command, decoding both inputs in hardware if possible.
+    
+    Inputs are opened with -hwaccel auto unless disabled via VQ_MCP_HWACCEL.
+    If that run fails because hardware decoding could not be set up (no
+    usable device, unsupported codec, ...), the command is retried once with
+    software decoding. Timeouts and other failures, which software decoding
+    would not fix, are raised immediately.
+    
+    Args:
+        distorted: Distorted video path
+        reference: Reference video path
+        output_args: Filtergraph and output arguments following the inputs
+        timeout: Timeout in seconds per attempt
+        
+    Raises:
+        FFmpegError: If the command fails for any other reason, or the
+            software decoding run fails
+    """
+    if hwaccel_enabled():
+        try:
+            run_command(
+                [FFMPEG, *_QUIET_ARGS,
+                 *_metric_inputs(distorted, reference, ["-hwaccel", "auto"]),
+                 *output_args],
+                timeout=timeout
+            )
+            return
+        except FFmpegCommandError as e:
+            if not _HWACCEL_ERROR_RE.search(e.stderr):
+                raise
+            # Fall back to software decoding
+    
+    run_command(
+        [FFMPEG, *_QUIET_ARGS, *_metric_inputs(distorted, reference), *output_args],
+        timeout=timeout
+    )
+
+
 def calculate_psnr(reference: str, distorted: str) -> Dict[str, float]:
     """
     Calculate PSNR using FFmpeg.
@@ -188,39 +802,20 @@ def calculate_psnr(reference: str, distorted: str) -> Dict[str, float]:
     if not os.path.exists(distorted):
         raise FFmpegError(f"Distorted video not found: {distorted}")
     
-    cmd = [
-        "ffmpeg",
-        "-i", distorted,
-        "-i", reference,
-        "-lavfi", "psnr=stats_file=psnr.log",
-        "-f", "null",
-        "-"
-    ]
-    
-    try:
-        run_command(cmd, timeout=300)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        psnr_log = os.path.join(tmpdir, "psnr.log")
+        _run_metric_command(
+            distorted,
+            reference,
+            ["-lavfi", f"psnr=stats_file={_filter_path(psnr_log)}", "-an", "-f", "null", "-"],
+            timeout=300
+        )
         
         # Parse PSNR log
-        if os.path.exists("psnr.log"):
-            with open("psnr.log", "r") as f:
-                lines = f.readlines()
-            
-            # Get average PSNR from last line
-            if lines:
-                last_line = lines[-1].strip()
-                # Format: n:Y:U:V
-                parts = last_line.split(":")
-                if len(parts) >= 4:
-                    return {
-                        "y": float(parts[1]) if parts[1] != "inf" else 100.0,
-                        "u": float(parts[2]) if parts[2] != "inf" else 100.0,
-                        "v": float(parts[3]) if parts[3] != "inf" else 100.0,
-                    }
+        if os.path.exists(psnr_log):
+            return _parse_psnr_log(psnr_log)
         
         raise FFmpegError("Failed to parse PSNR output")
-    finally:
-        if os.path.exists("psnr.log"):
-            os.remove("psnr.log")
 
 
 def calculate_ssim(reference: str, distorted: str) -> float:
@@ -239,45 +834,169 @@ def calculate_ssim(reference: str, distorted: str) -> float:
     if not os.path.exists(distorted):
         raise FFmpegError(f"Distorted video not found: {distorted}")
     
-    cmd = [
-        "ffmpeg",
-        "-i", distorted,
-        "-i", reference,
-        "-lavfi", "ssim=stats_file=ssim.log",
-        "-f", "null",
-        "-"
-    ]
-    
-    try:
-        run_command(cmd, timeout=300)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ssim_log = os.path.join(tmpdir, "ssim.log")
+        _run_metric_command(
+            distorted,
+            reference,
+            ["-lavfi", f"ssim=stats_file={_filter_path(ssim_log)}", "-an", "-f", "null", "-"],
+            timeout=300
+        )
         
         # Parse SSIM log
-        if os.path.exists("ssim.log"):
-            with open("ssim.log", "r") as f:
-                lines = f.readlines()
-            
-            # Get average SSIM from last line
-            if lines:
-                last_line = lines[-1].strip()
-                # Format: n:Y:U:V:All
-                parts = last_line.split(":")
-                if len(parts) >= 5:
-                    return float(parts[4])
+        if os.path.exists(ssim_log):
+            return _parse_ssim_log(ssim_log)
         
         raise FFmpegError("Failed to parse SSIM output")
-    finally:
-        if os.path.exists("ssim.log"):
-            os.remove("ssim.log")
 
 
-def calculate_vmaf(reference: str, distorted: str, model: str = "vmaf_v0.6.1") -> Dict[str, Any]:
+def calculate_psnr_ssim(reference: str, distorted: str) -> Tuple[Dict[str, float], float]:
+    """
+    Calculate PSNR and SSIM in a single FFmpeg pass.
+    
+    Both inputs are decoded once and split into the psnr and ssim filters,
+    instead of one decode pass per metric.
+    
+    Args:
+        reference: Reference video path
+        distorted: Distorted video path
+        
+    Returns:
+        Tuple of (Y/U/V PSNR dictionary, SSIM score)
+    """
+    if not os.path.exists(reference):
+        raise FFmpegError(f"Reference video not found: {reference}")
+    if not os.path.exists(distorted):
+        raise FFmpegError(f"Distorted video not found: {distorted}")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        psnr_log = os.path.join(tmpdir, "psnr.log")
+        ssim_log = os.path.join(tmpdir, "ssim.log")
+        
+        _run_metric_command(
+            distorted,
+            reference,
+            [
+                "-lavfi", (
+                    "[0:v]split=2[d1][d2];"
+                    "[1:v]split=2[r1][r2];"
+                    f"[d1][r1]psnr=stats_file={_filter_path(psnr_log)};"
+                    f"[d2][r2]ssim=stats_file={_filter_path(ssim_log)}"
+                ),
+                "-an",
+                "-f", "null",
+                "-"
+            ],
+            timeout=300
+        )
+        
+        try:
+            return _parse_psnr_log(psnr_log), _parse_ssim_log(ssim_log)
+        except (OSError, ValueError) as e:
+            raise FFmpegError(f"Failed to parse PSNR/SSIM output: {e}")
+
+
+def _vmaf_pix_fmt(reference: str) -> str:
+    """
+    Pick the pixel format both VMAF inputs are converted to.
+    
+    Using the reference's own format when libvmaf supports it means at most
+    one input needs converting (and none when both already match), instead
+    of libvmaf's per-frame internal conversion.
+    """
+    try:
+        stream = get_video_stream(get_video_info(reference).get("streams", []))
+    except FFmpegError:
+        stream = None
+    
+    pix_fmt = (stream or {}).get("pix_fmt")
+    return pix_fmt if pix_fmt in _VMAF_PIX_FMTS else "yuv420p"
+
+
+def _read_vmaf_score(log_path: str) -> float:
+    """
+    Read the pooled mean VMAF score from a libvmaf JSON log (log_fmt=json).
+    
+    libvmaf already pools per-frame scores, so no per-frame parsing is needed.
+    """
+    try:
+        with open(log_path, "r") as f:
+            return float(json.load(f)["pooled_metrics"]["vmaf"]["mean"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise FFmpegError(f"Failed to parse VMAF output: {e}")
+
+
+def _subsample_option(subsample: int) -> str:
+    """Return the libvmaf n_subsample option, or nothing for every frame."""
+    return f":n_subsample={subsample}" if subsample > 1 else ""
+
+
+@functools.lru_cache(maxsize=None)
+def has_cuda_vmaf() -> bool:
+    """
+    Check whether FFmpeg can run CUDA decoding and the libvmaf_cuda filter.
+    
+    Any CUDA-enabled build lists the filter and hwaccel, even on hosts
+    without a GPU or driver, so a CUDA device is also created once to
+    confirm the pipeline is usable. The probe runs once per process; the
+    result is cached.
+    
+    Returns:
+        True if the CUDA VMAF pipeline can be used
+    """
+    try:
+        filters, _ = run_command([FFMPEG, "-hide_banner", "-filters"], timeout=30)
+        hwaccels, _ = run_command([FFMPEG, "-hide_banner", "-hwaccels"], timeout=30)
+    except FFmpegError:
+        return False
+    
+    has_filter = any(
+        len(parts) >= 2 and parts[1] == b"libvmaf_cuda"
+        for parts in (line.split() for line in filters.splitlines())
+    )
+    has_hwaccel = any(line.strip() == b"cuda" for line in hwaccels.splitlines())
+    if not (has_filter and has_hwaccel):
+        return False
+    
+    try:
+        run_command([
+            FFMPEG,
+            *_QUIET_ARGS,
+            "-init_hw_device", "cuda",
+            "-f", "lavfi",
+            "-i", "nullsrc=size=64x64",
+            "-frames:v", "1",
+            "-f", "null",
+            "-"
+        ], timeout=30)
+    except FFmpegError:
+        return False
+    
+    return True
+
+
+def calculate_vmaf(
+    reference: str,
+    distorted: str,
+    model: str = "vmaf_v0.6.1",
+    vmaf_cuda: Optional[bool] = None,
+    subsample: int = 1
+) -> Dict[str, Any]:
     """
     Calculate VMAF using FFmpeg (requires libvmaf).
     
+    When FFmpeg is built with CUDA support and a CUDA device is usable,
+    decoding and VMAF feature extraction run on the GPU via NVDEC and
+    libvmaf_cuda. In automatic mode a failed CUDA run is retried with CPU
+    libvmaf.
+    
     Args:
         reference: Reference video path
         distorted: Distorted video path
         model: VMAF model version
+        vmaf_cuda: Force (True) or disable (False) the CUDA pipeline;
+            None selects it automatically when available
+        subsample: Compute features on every Nth frame only (1 = all frames)
         
     Returns:
         Dictionary with VMAF score and model info
@@ -287,48 +1006,134 @@ def calculate_vmaf(reference: str, distorted: str, model: str = "vmaf_v0.6.1") -
     if not os.path.exists(distorted):
         raise FFmpegError(f"Distorted video not found: {distorted}")
     
-    cmd = [
-        "ffmpeg",
-        "-i", distorted,
-        "-i", reference,
-        "-lavfi", f"libvmaf=model=version={model}:log_path=vmaf.log",
-        "-f", "null",
-        "-"
-    ]
+    use_cuda = has_cuda_vmaf() if vmaf_cuda is None else vmaf_cuda
+    if use_cuda and not has_cuda_vmaf():
+        raise FFmpegError(
+            "CUDA VMAF requested but FFmpeg lacks libvmaf_cuda or CUDA hwaccel support."
+        )
     
-    try:
-        run_command(cmd, timeout=600)
+    # Per-call log path so concurrent calculations do not collide
+    with tempfile.TemporaryDirectory() as tmpdir:
+        vmaf_log = os.path.join(tmpdir, "vmaf.json")
         
-        # Parse VMAF log
-        if os.path.exists("vmaf.log"):
-            with open("vmaf.log", "r") as f:
-                content = f.read()
+        try:
+            if use_cuda:
+                try:
+                    run_command([
+                        FFMPEG,
+                        *_QUIET_ARGS,
+                        *_metric_inputs(
+                            distorted, reference,
+                            ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+                        ),
+                        "-lavfi", (
+                            "[0:v]scale_npp=format=yuv420p[dis];"
+                            "[1:v]scale_npp=format=yuv420p[ref];"
+                            f"[dis][ref]libvmaf_cuda=model=version={model}"
+                            f"{_subsample_option(subsample)}:log_path={_filter_path(vmaf_log)}:log_fmt=json"
+                        ),
+                        "-an",
+                        "-f", "null",
+                        "-"
+                    ], timeout=600)
+                except FFmpegCommandError:
+                    # Only a forced CUDA run reports the failure; automatic mode
+                    # falls back to CPU libvmaf below
+                    if vmaf_cuda:
+                        raise
+                    use_cuda = False
             
-            # Extract average VMAF score
-            # VMAF log format: frame_number VMAF_score
-            lines = content.strip().split("\n")
-            if lines:
-                scores = []
-                for line in lines[1:]:  # Skip header
-                    parts = line.strip().split()
-                    if len(parts) >= 2:
-                        try:
-                            scores.append(float(parts[1]))
-                        except ValueError:
-                            continue
-                
-                if scores:
-                    avg_score = sum(scores) / len(scores)
-                    return {
-                        "score": avg_score,
-                        "model": model
-                    }
-        
-        raise FFmpegError("Failed to parse VMAF output. Ensure libvmaf is installed.")
-    except FFmpegError:
-        # If VMAF fails, return a fallback
-        raise FFmpegError("VMAF calculation failed. Ensure libvmaf is installed and videos are compatible.")
-    finally:
-        if os.path.exists("vmaf.log"):
-            os.remove("vmaf.log")
+            if not use_cuda:
+                pix_fmt = _vmaf_pix_fmt(reference)
+                _run_metric_command(distorted, reference, [
+                    "-lavfi", (
+                        f"[0:v]format={pix_fmt}[dis];"
+                        f"[1:v]format={pix_fmt}[ref];"
+                        f"[dis][ref]libvmaf=model=version={model}"
+                        f":n_threads={os.cpu_count() or 1}{_subsample_option(subsample)}"
+                        f":log_path={_filter_path(vmaf_log)}:log_fmt=json"
+                    ),
+                    "-an",
+                    "-f", "null",
+                    "-"
+                ], timeout=600)
+            
+            # Parse VMAF log
+            if os.path.exists(vmaf_log):
+                return {
+                    "score": _read_vmaf_score(vmaf_log),
+                    "model": model
+                }
+            
+            raise FFmpegError("Failed to parse VMAF output. Ensure libvmaf is installed.")
+        except FFmpegTimeoutError:
+            raise
+        except FFmpegError as e:
+            raise FFmpegError(
+                f"VMAF calculation failed. Ensure libvmaf is installed and videos are compatible.\n{e}"
+            ) from e
 
+
+def calculate_all_metrics(
+    reference: str,
+    distorted: str,
+    model: str = "vmaf_v0.6.1",
+    subsample: int = 1
+) -> Dict[str, Any]:
+    """
+    Calculate PSNR, SSIM and VMAF in a single FFmpeg pass (requires libvmaf).
+    
+    Each input is decoded once and split into the psnr, ssim and libvmaf
+    filters of one filtergraph, instead of three separate decode passes.
+    
+    Args:
+        reference: Reference video path
+        distorted: Distorted video path
+        model: VMAF model version
+        subsample: Compute VMAF on every Nth frame only (1 = all frames)
+        
+    Returns:
+        Dictionary with "psnr" (Y/U/V), "ssim" and "vmaf" (score and model)
+    """
+    if not os.path.exists(reference):
+        raise FFmpegError(f"Reference video not found: {reference}")
+    if not os.path.exists(distorted):
+        raise FFmpegError(f"Distorted video not found: {distorted}")
+    
+    pix_fmt = _vmaf_pix_fmt(reference)
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        psnr_log = os.path.join(tmpdir, "psnr.log")
+        ssim_log = os.path.join(tmpdir, "ssim.log")
+        vmaf_log = os.path.join(tmpdir, "vmaf.json")
+        
+        output_args = [
+            "-lavfi", (
+                "[0:v]split=3[d1][d2][d3];"
+                "[1:v]split=3[r1][r2][r3];"
+                f"[d1][r1]psnr=stats_file={_filter_path(psnr_log)};"
+                f"[d2][r2]ssim=stats_file={_filter_path(ssim_log)};"
+                f"[d3]format={pix_fmt}[d3f];"
+                f"[r3]format={pix_fmt}[r3f];"
+                f"[d3f][r3f]libvmaf=model=version={model}"
+                f":n_threads={os.cpu_count() or 1}{_subsample_option(subsample)}"
+                f":log_path={_filter_path(vmaf_log)}:log_fmt=json"
+            ),
+            "-an",
+            "-f", "null",
+            "-"
+        ]
+        
+        _run_metric_command(distorted, reference, output_args, timeout=600)
+        
+        try:
+            return {
+                "psnr": _parse_psnr_log(psnr_log),
+                "ssim": _parse_ssim_log(ssim_log),
+                "vmaf": {
+                    "score": _read_vmaf_score(vmaf_log),
+                    "model": model
+                }
+            }
+        except (OSError, ValueError) as e:
+            raise FFmpegError(f"Failed to parse combined metrics output: {e}")
@@ -1,6 +1,58 @@
 """Parsing utilities for FFmpeg/ffprobe output."""
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
+import functools
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib decoder
+    orjson = None
+
+
+# Number of distinct strings memoized by parse_fps and parse_bitrate; ffprobe
+# output repeats the same frame rates and bitrates across streams and files
+_PARSE_CACHE_SIZE = 256
+
+# Picture types reported by parse_frame_type / classify_frames
+FRAME_TYPES = ("I", "P", "B")
+
+
+def parse_json(data: Union[str, bytes]) -> Any:
+    """
+    Decode ffprobe JSON output, using orjson when it is installed.
+    
+    Args:
+        data: JSON document as text or raw bytes
+        
+    Returns:
+        Decoded JSON value
+        
+    Raises:
+        ValueError: If data is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(value: Any) -> bytes:
+    """
+    Encode a JSON value to UTF-8 bytes, using orjson when it is installed.
+    
+    Args:
+        value: JSON-serializable value
+        
+    Returns:
+        Encoded JSON document
+        
+    Raises:
+        TypeError: If value is not JSON serializable
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
 
 
 def parse_duration(duration_str: Optional[str]) -> float:
@@ -21,6 +73,7 @@ def parse_duration(duration_str: Optional[str]) -> float:
         return 0.0
 
 
+@functools.lru_cache(maxsize=_PARSE_CACHE_SIZE)
 def parse_bitrate(bitrate_str: Optional[str]) -> int:
     """
     Parse bitrate string to integer bits per second.
@@ -39,6 +92,7 @@ def parse_bitrate(bitrate_str: Optional[str]) -> int:
         return 0
 
 
+@functools.lru_cache(maxsize=_PARSE_CACHE_SIZE)
 def parse_fps(fps_str: Optional[str]) -> float:
     """
     Parse frame rate string to float.
@@ -53,12 +107,11 @@ def parse_fps(fps_str: Optional[str]) -> float:
         return 0.0
     
     try:
-        # Handle fraction format (e.g., "30000/1001")
-        if "/" in fps_str:
-            num, den = fps_str.split("/")
-            return float(num) / float(den)
-        return float(fps_str)
-    except (ValueError, TypeError):
+        # Handle fraction format (e.g., "30000/1001"); ffprobe reports "0/0"
+        # for streams without a frame rate
+        num, sep, den = fps_str.partition("/")
+        return float(num) / float(den) if sep else float(num)
+    except (ValueError, TypeError, ZeroDivisionError):
         return 0.0
 
 
@@ -108,7 +161,7 @@ def parse_frame_type(pict_type: Optional[str]) -> str:
         return "Unknown"
     
     pict_type = pict_type.upper()
-    if pict_type in ["I", "P", "B"]:
+    if pict_type in FRAME_TYPES:
         return pict_type
     return "Unknown"
 
@@ -127,3 +180,31 @@ def parse_keyframe_flag(flags: Optional[str]) -> bool:
         return False
     return "K" in flags or "key_frame" in flags.lower()
 
+
+def classify_frames(frames: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify a whole list of ffprobe frames at once.
+    
+    Vectorized equivalent of calling parse_frame_type on every frame's
+    pict_type, plus keyframe detection from key_frame or an I picture type.
+    
+    Args:
+        frames: Frame dictionaries from ffprobe -show_frames
+        
+    Returns:
+        Tuple of (types, keyframes): a string array holding "I", "P", "B",
+        or "" for unknown types, and a boolean keyframe mask
+    """
+    types = np.char.upper(
+        np.array([frame.get("pict_type") or "" for frame in frames], dtype="U2")
+    )
+    types[~np.isin(types, FRAME_TYPES)] = ""
+    
+    keyframes = np.fromiter(
+        (frame.get("key_frame") == 1 for frame in frames),
+        dtype=bool,
+        count=len(frames)
+    )
+    keyframes |= types == "I"
+    
+    return types, keyframes
@@ -0,0 +1,138 @@
+"""Persistent SQLite cache for ffprobe results."""
+
+import os
+import sqlite3
+from typing import Any, Callable, Optional
+from utils.parsing import dump_json, parse_json
+
+
+# Set VQ_MCP_NO_CACHE=1 to bypass the on-disk cache (useful for debugging)
+NO_CACHE_ENV = "VQ_MCP_NO_CACHE"
+# Override the cache database location
+CACHE_PATH_ENV = "VQ_MCP_CACHE_PATH"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probe (
+    path TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    json BLOB NOT NULL,
+    PRIMARY KEY (path, mtime, size, kind)
+)
+"""
+
+
+def cache_enabled() -> bool:
+    """Return False when the on-disk cache is disabled via environment."""
+    return os.environ.get(NO_CACHE_ENV, "").lower() not in ("1", "true", "yes")
+
+
+def get_cache_path() -> str:
+    """Return the path of the SQLite cache database."""
+    override = os.environ.get(CACHE_PATH_ENV)
+    if override:
+        return override
+    
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "video-quality-mcp", "probe.sqlite3")
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a connection to the cache database, creating it if needed."""
+    db_path = get_cache_path()
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    
+    conn = sqlite3.connect(db_path, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def lookup(path: str, mtime: int, size: int, kind: str) -> Optional[Any]:
+    """
+    Look up a cached probe result.
+    
+    Args:
+        path: Absolute path to the probed file
+        mtime: File modification time in nanoseconds
+        size: File size in bytes
+        kind: Probe type tagged with its version (e.g. "video_info:<digest>")
+    
+    Returns:
+        Decoded JSON value, or None on a miss or cache error
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT json FROM probe WHERE path = ? AND mtime = ? AND size = ? AND kind = ?",
+                (path, mtime, size, kind)
+            ).fetchone()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return None
+    
+    if row is None:
+        return None
+    
+    try:
+        return parse_json(row[0])
+    except (TypeError, ValueError):
+        return None
+
+
+def store(path: str, mtime: int, size: int, kind: str, value: Any) -> None:
+    """
+    Store a probe result, replacing entries for older revisions of the file.
+    
+    Rows of the same probe type written with another version tag (the part
+    of kind after ":") are replaced as well. Cache write failures are
+    ignored; the cache is only an optimization.
+    """
+    base_kind = kind.partition(":")[0]
+    try:
+        blob = dump_json(value)
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM probe WHERE path = ? AND (kind = ? OR kind LIKE ?)",
+                    (path, base_kind, base_kind + ":%")
+                )
+                conn.execute(
+                    "INSERT INTO probe (path, mtime, size, kind, json) VALUES (?, ?, ?, ?, ?)",
+                    (path, mtime, size, kind, blob)
+                )
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, TypeError, ValueError):
+        pass
+
+
+def cached_probe(path: str, mtime: int, size: int, kind: str, compute: Callable[[], Any]) -> Any:
+    """
+    Return a cached probe result, running compute() and storing it on a miss.
+    
+    Args:
+        path: Path to the probed file
+        mtime: File modification time in nanoseconds
+        size: File size in bytes
+        kind: Probe type tagged with its version (e.g. "video_info:<digest>")
+        compute: Callable that runs the actual probe
+    
+    Returns:
+        Probe result
+    """
+    if not cache_enabled():
+        return compute()
+    
+    abspath = os.path.abspath(path)
+    value = lookup(abspath, mtime, size, kind)
+    if value is not None:
+        return value
+    
+    value = compute()
+    store(abspath, mtime, size, kind, value)
+    return value